@@ -17,17 +17,25 @@ overlay (see `flavors/README.md`) — those pin their own package versions
 """
 
 import asyncio
+import json
+import random
 import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Callable
 
 import diskcache
 import httpx
 import typer
 import yaml
 from rich import box
-from rich.console import Console
+from rich.console import Console, Group
+from rich.live import Live
 from rich.table import Table
 
 app = typer.Typer(help="Check spack package versions for updates.")
@@ -39,6 +47,17 @@ SPEC_NAME_VERSION_RE = re.compile(r"^([a-zA-Z0-9_-]+)(?:\s*@\s*([^\s+~^%]+))?")
 
 cache = diskcache.Cache(Path.home() / ".cache" / "spack-check-versions")
 
+# Entries are kept without a diskcache expiry so their ETag/Last-Modified
+# validators outlive the TTL; `fetched_at` decides freshness against --max-age,
+# and a stale entry is revalidated with a conditional GET. The key is
+# namespaced so entries written by older versions of this script (the bare
+# response body under the package name) are simply ignored.
+CACHE_KEY_PREFIX = "packages.v2:"
+DEFAULT_MAX_AGE = 60 * 60
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled after each
+
 
 NO_AUTO_UPDATE_MARKER = "no-auto-update"
 
@@ -53,6 +72,22 @@ class Source:
     no_auto_update: set[str]
 
 
+@dataclass(frozen=True)
+class Bump:
+    """One proposed version change in one source file."""
+
+    path: Path
+    kind: str  # kind of the Source it comes from
+    name: str
+    current: str
+    latest: str
+
+    @property
+    def flavor(self) -> str | None:
+        """The flavor whose overlay this bump lives in, None for spack.yaml."""
+        return None if self.kind == "yaml" else self.path.stem
+
+
 def extract_name_version(spec: str) -> tuple[str, str | None] | None:
     """Parse a spack spec string like 'name@1.2.3 +variant' into (name, version)."""
     match = SPEC_NAME_VERSION_RE.match(spec.strip())
@@ -121,30 +156,171 @@ def discover_sources(
     return sources
 
 
-async def get_latest_safe_version(
-    package: str, client: httpx.AsyncClient, sem: asyncio.Semaphore
-) -> str | None:
-    """Query packages.spack.io and return the latest numeric safe version."""
-    if package in cache:
-        data = cache[package]
-    else:
-        url = f"{PACKAGES_URL}/{package}.json"
+def cache_key(package: str) -> str:
+    return f"{CACHE_KEY_PREFIX}{package}"
+
+
+async def fetch_package_data(
+    package: str,
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    max_age: int,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> dict | None:
+    """Return the packages.spack.io JSON for `package`, using the cache.
+
+    A cached entry younger than `max_age` seconds is returned as-is. An older
+    one is revalidated with If-None-Match/If-Modified-Since: a 304 only bumps
+    its timestamp, a 200 replaces it. Either way the entry is written back as
+    soon as the response is in, so an interrupted run keeps what it fetched.
+
+    Timeouts, connection errors, 429 and 5xx responses are retried up to
+    `retries` times with exponential backoff. If the request still fails, a
+    stale entry is better than nothing and is returned.
+    """
+    key = cache_key(package)
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry["fetched_at"] < max_age:
+        return entry["data"]
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    url = f"{PACKAGES_URL}/{package}.json"
+    for attempt in range(retries + 1):
+        if attempt:
+            delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
         try:
             async with sem:
-                resp = await client.get(url, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
-        except (httpx.HTTPError, httpx.TimeoutException):
-            return None
-        cache.set(package, data, expire=60 * 60)
+                resp = await client.get(url, headers=headers, timeout=timeout)
+        except httpx.TransportError:
+            continue
+        if resp.status_code == 429 or resp.status_code >= 500:
+            continue
+        break
+    else:
+        return entry["data"] if entry is not None else None
+
+    try:
+        if resp.status_code == 304 and entry is not None:
+            entry["fetched_at"] = time.time()
+            cache.set(key, entry)
+            return entry["data"]
+        resp.raise_for_status()
+        data = resp.json()
+    except (httpx.HTTPError, ValueError):
+        return entry["data"] if entry is not None else None
+
+    cache.set(
+        key,
+        {
+            "data": data,
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "fetched_at": time.time(),
+        },
+    )
+    return data
 
-    for v in data.get("versions", []):
-        name = v if isinstance(v, str) else v.get("name", "")
+
+def latest_safe_from_data(data: dict) -> str | None:
+    """Return the newest numeric version listed in a packages.spack.io entry."""
+    names = [
+        v if isinstance(v, str) else v.get("name", "") for v in data.get("versions", [])
+    ]
+    return latest_safe_from_versions(names)  # site lists newest first
+
+
+def latest_safe_from_versions(versions: list[str]) -> str | None:
+    """Return the first numeric version of a newest-first version list."""
+    for name in versions:
         if re.match(r"^\d", name):
-            return normalize_version(name)  # site lists newest first
+            return normalize_version(name)
     return None
 
 
+async def get_latest_safe_version(
+    package: str,
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    max_age: int = DEFAULT_MAX_AGE,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> str | None:
+    """Query packages.spack.io and return the latest numeric safe version."""
+    data = await fetch_package_data(package, client, sem, max_age, timeout, retries)
+    if data is None:
+        return None
+    return latest_safe_from_data(data)
+
+
+# Run via `spack python` so the versions come from the very package classes
+# that spack would concretize against — including overlay repos like
+# spack_repo/acts, and versions added in loops that no static parse would see.
+# Deprecated versions are dropped, as packages.spack.io does for "safe" ones.
+SPACK_VERSIONS_SCRIPT = """\
+import json
+
+import spack.repo
+
+result = {}
+for name in %(names)r:
+    try:
+        pkg_cls = spack.repo.PATH.get_pkg_class(name)
+    except Exception:
+        result[name] = None
+        continue
+    versions = sorted(
+        (v for v, info in pkg_cls.versions.items() if not info.get("deprecated")),
+        reverse=True,
+    )
+    result[name] = [str(v) for v in versions]
+print(json.dumps(result))
+"""
+
+
+def get_latest_versions_from_spack(
+    names: list[str], spack_root: Path, env_dir: Path
+) -> dict[str, str | None]:
+    """Resolve the latest safe version of every package in one `spack python` run.
+
+    The environment at `env_dir` is activated so the repos it configures
+    (spack.yaml's `repos:`) take part, exactly as in a build. Nothing is
+    fetched from the network, so this works offline.
+    """
+    spack = spack_root / "bin" / "spack"
+    if not spack.exists():
+        console.print(
+            f"[red]Error: {spack} not found; is {spack_root} a spack checkout?[/red]"
+        )
+        raise typer.Exit(1)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", prefix="check-versions-") as script:
+        script.write(SPACK_VERSIONS_SCRIPT % {"names": names})
+        script.flush()
+        result = subprocess.run(
+            [str(spack), "-e", str(env_dir), "python", script.name],
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode != 0:
+        console.print(f"[red]Error: spack python failed:[/red]\n{result.stderr}")
+        raise typer.Exit(1)
+
+    # spack may print warnings ahead of the payload; the JSON is the last line.
+    versions_by_name = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        name: latest_safe_from_versions(versions) if versions else None
+        for name, versions in versions_by_name.items()
+    }
+
+
 def version_satisfied(constraint: str, latest: str) -> bool:
     """Return True if `latest` satisfies the spack version constraint.
 
@@ -252,7 +428,372 @@ def update_flavor_specs(specs_path: Path, updates: dict[str, str]) -> int:
     return changed
 
 
-def build_table(source: Source, latest_by_name: dict[str, str | None]) -> tuple[Table, list[dict]]:
+def _output_tail(result: subprocess.CompletedProcess, lines: int = 15) -> str:
+    return "\n".join((result.stdout + result.stderr).strip().splitlines()[-lines:])
+
+
+@dataclass(frozen=True)
+class Toolchain:
+    """What spack_build.sh constrains an environment to before concretizing."""
+
+    cxxstd: str
+    compiler: str | None = None  # e.g. gcc@15.2.0; None leaves it to spack
+    compiler_path: Path | None = None  # as COMPILER_PATH: searched by compiler find
+
+
+def concretize_scenario(
+    spack: str,
+    spack_yaml: Path,
+    flavors_dir: Path,
+    flavor: str | None,
+    toolchain: Toolchain,
+    bumps: tuple[Bump, ...],
+) -> tuple[bool, str]:
+    """Concretize a scratch copy of the environment with `bumps` applied.
+
+    Mirrors how spack_build.sh assembles the environment: spack.yaml next to a
+    `spack_repo` symlink, and for a flavor its `.yaml` merged with `spack
+    config add -f` and each `.specs` line applied with `spack change`, falling
+    back to `spack add`. Then, as there, compilers are found into the
+    environment's scope, every package is required to use the toolchain's
+    cxxstd and the compiler provides c and cxx. Runs in a worker process;
+    returns (ok, output tail).
+    """
+    with tempfile.TemporaryDirectory(prefix="check-versions-") as tmp:
+        env_dir = Path(tmp)
+
+        def spack_env(*args: str) -> subprocess.CompletedProcess:
+            return subprocess.run(
+                [spack, "-e", str(env_dir), *args], capture_output=True, text=True
+            )
+
+        shutil.copy(spack_yaml, env_dir / "spack.yaml")
+        update_spack_yaml(
+            env_dir / "spack.yaml",
+            {b.name: b.latest for b in bumps if b.kind == "yaml"},
+        )
+        repo = spack_yaml.resolve().parent / "spack_repo"
+        if repo.is_dir():
+            (env_dir / "spack_repo").symlink_to(repo)
+
+        if flavor is not None:
+            flavor_cfg = flavors_dir / f"{flavor}.yaml"
+            if flavor_cfg.exists():
+                result = spack_env("config", "add", "-f", str(flavor_cfg.resolve()))
+                if result.returncode != 0:
+                    return False, _output_tail(result)
+
+            flavor_specs = flavors_dir / f"{flavor}.specs"
+            if flavor_specs.exists():
+                scratch_specs = env_dir / flavor_specs.name
+                shutil.copy(flavor_specs, scratch_specs)
+                update_flavor_specs(
+                    scratch_specs,
+                    {b.name: b.latest for b in bumps if b.flavor == flavor},
+                )
+                for raw_line in scratch_specs.read_text().splitlines():
+                    line = raw_line.split("#", 1)[0].strip()
+                    if not line:
+                        continue
+                    if spack_env("change", line).returncode == 0:
+                        continue
+                    result = spack_env("add", line)
+                    if result.returncode != 0:
+                        return False, _output_tail(result)
+
+        find = ["compiler", "find", "--scope", f"env:{env_dir}"]
+        if toolchain.compiler_path is not None:
+            # gcc-toolset keeps its binaries in <prefix>/usr/bin, see spack_build.sh
+            prefix = toolchain.compiler_path
+            find += [str(prefix), str(prefix / "usr" / "bin")]
+        requires = [f'packages:all:require:["cxxstd={toolchain.cxxstd}"]']
+        if toolchain.compiler is not None:
+            requires += [
+                f'packages:c:require:["{toolchain.compiler}"]',
+                f'packages:cxx:require:["{toolchain.compiler}"]',
+            ]
+        for args in [find, *(["config", "add", r] for r in requires)]:
+            result = spack_env(*args)
+            if result.returncode != 0:
+                return False, _output_tail(result)
+
+        result = spack_env("concretize", "-Uf")
+        return result.returncode == 0, _output_tail(result)
+
+
+def scenarios_for(bumps: tuple[Bump, ...], flavors: list[str]) -> list[str | None]:
+    """Environments a set of bumps can break.
+
+    Every flavor is overlaid on spack.yaml, so a spack.yaml bump has to hold in
+    the plain (None) environment and under each flavor; a flavor bump only in
+    its own flavor.
+    """
+    if any(b.kind == "yaml" for b in bumps):
+        return [None, *flavors]
+    return sorted({b.flavor for b in bumps if b.flavor is not None})
+
+
+def validate_bumps(
+    bumps: list[Bump],
+    spack: str,
+    spack_yaml: Path,
+    flavors_dir: Path,
+    flavors: list[str],
+    toolchains: list[Toolchain],
+    workers: int,
+) -> tuple[dict[Bump, str | None], list[Bump]]:
+    """Concretize each bump on its own, then find a combination that holds together.
+
+    Every environment a bump can break is concretized once per toolchain.
+    Returns ({bump: failure output, or None if it concretized alone}, the
+    combination). All single-bump checks run at once across the process pool.
+    If the bumps that pass alone also pass together that is the combination;
+    otherwise they are added one at a time, keeping each that still
+    concretizes with the ones kept before it.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def submit(bump_set: tuple[Bump, ...]) -> dict[Future, str]:
+            return {
+                executor.submit(
+                    concretize_scenario,
+                    spack,
+                    spack_yaml,
+                    flavors_dir,
+                    flavor,
+                    toolchain,
+                    bump_set,
+                ): f"{flavor or 'spack.yaml'}, {toolchain.compiler or 'any compiler'}, "
+                f"cxxstd={toolchain.cxxstd}"
+                for flavor in scenarios_for(bump_set, flavors)
+                for toolchain in toolchains
+            }
+
+        def failure(futures: dict[Future, str]) -> str | None:
+            for future, label in futures.items():
+                ok, log = future.result()
+                if not ok:
+                    return f"[{label}]\n{log}"
+            return None
+
+        pending = {bump: submit((bump,)) for bump in bumps}
+        alone = {bump: failure(futures) for bump, futures in pending.items()}
+        passing = [bump for bump in bumps if alone[bump] is None]
+
+        if len(passing) <= 1 or failure(submit(tuple(passing))) is None:
+            return alone, passing
+
+        combined: list[Bump] = []
+        for bump in passing:
+            if failure(submit((*combined, bump))) is None:
+                combined.append(bump)
+        return alone, combined
+
+
+def print_validation(
+    bumps: list[Bump], alone: dict[Bump, str | None], combined: list[Bump]
+) -> None:
+    table = Table(
+        box=box.ROUNDED,
+        show_header=True,
+        header_style="bold magenta",
+        title="Concretization check",
+        title_style="bold",
+    )
+    table.add_column("Package", style="bold")
+    table.add_column("File")
+    table.add_column("Bump")
+    table.add_column("Alone")
+    table.add_column("Together")
+    for bump in bumps:
+        ok_alone = alone[bump] is None
+        table.add_row(
+            bump.name,
+            str(bump.path),
+            f"{bump.current} → {bump.latest}",
+            "[green]concretizes[/green]" if ok_alone else "[red]fails[/red]",
+            "[green]yes[/green]" if bump in combined else "[dim]no[/dim]",
+        )
+    console.print(table)
+
+    for bump in bumps:
+        if alone[bump] is not None:
+            console.print(f"[red]{bump.name}@{bump.latest} ({bump.path}) fails:[/red]")
+            console.print(alone[bump], markup=False, highlight=False)
+    if combined:
+        console.print(
+            f"[green]{len(combined)} of {len(bumps)} bump(s) concretize together:[/green] "
+            + ", ".join(f"{b.name}@{b.latest}" for b in combined)
+        )
+    else:
+        console.print("[red]No proposed bump concretizes.[/red]")
+    console.print()
+
+
+@dataclass
+class Batch:
+    """Bumps that share rebuilt specs, and so are cheapest landed together."""
+
+    bumps: list[Bump]
+    rebuilds: set[str]  # lockfile hashes invalidated by the batch
+    separate_cost: int  # rebuilds if each bump landed on its own
+
+
+def load_lock_graph(
+    lockfile: Path,
+) -> tuple[dict[str, list[str]], dict[str, set[str]]]:
+    """Return ({name: [hashes]}, {hash: hashes of its direct dependents}).
+
+    Every dependency type counts: a build-only dependency is part of a
+    spec's hash too, so bumping it invalidates the dependent's buildcache
+    entry just the same.
+    """
+    data = json.loads(lockfile.read_text())
+    hashes_by_name: dict[str, list[str]] = {}
+    dependents: dict[str, set[str]] = {}
+    for spec_hash, spec in data.get("concrete_specs", {}).items():
+        hashes_by_name.setdefault(spec["name"], []).append(spec_hash)
+        for dep in spec.get("dependencies") or []:
+            dependents.setdefault(dep["hash"], set()).add(spec_hash)
+    return hashes_by_name, dependents
+
+
+def rebuild_set(
+    name: str, hashes_by_name: dict[str, list[str]], dependents: dict[str, set[str]]
+) -> set[str]:
+    """Hashes that change when `name` changes: its specs and all their dependents.
+
+    A package not in the lockfile yet still costs one build of its own, which
+    is counted under a placeholder key.
+    """
+    stack = list(hashes_by_name.get(name, []))
+    if not stack:
+        return {f"<new>{name}"}
+    seen: set[str] = set()
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        stack.extend(dependents.get(current, ()))
+    return seen
+
+
+def plan_batches(
+    bumps: list[Bump], lockfile: Path, max_size: int = 0
+) -> tuple[list[Batch], dict[Bump, int]]:
+    """Group bumps whose rebuilds overlap, cheapest batch first.
+
+    Two bumps that invalidate any spec in common rebuild it once if landed
+    together and twice if landed apart, so merging them never costs more.
+    Batches are merged pairwise, the two sharing the most rebuilt specs
+    first, until no two overlap or every merge left would exceed `max_size`
+    bumps. Without a cap (0) that ends at the connected components of the
+    overlap, and a bump of something nearly everything depends on, like
+    cmake, pulls every other bump into its batch. With one, such a bump
+    joins the bumps it shares most with and the rest stay apart, at the
+    price of rebuilding what they share once per batch. Returns the batches
+    and each bump's own rebuild count, for ranking.
+    """
+    hashes_by_name, dependents = load_lock_graph(lockfile)
+    rebuilds = {b: rebuild_set(b.name, hashes_by_name, dependents) for b in bumps}
+
+    groups = [([bump], set(rebuilds[bump])) for bump in bumps]
+    while True:
+        # (shared rebuilds, i, j) of every pair that may merge; ties go to
+        # the earliest pair, so the plan follows the order of the bumps
+        pairs = [
+            (len(groups[i][1] & groups[j][1]), -i, -j)
+            for i in range(len(groups))
+            for j in range(i + 1, len(groups))
+            if not max_size or len(groups[i][0]) + len(groups[j][0]) <= max_size
+        ]
+        shared, i, j = max(pairs, default=(0, 0, 0))
+        if not shared:
+            break
+        i, j = -i, -j
+        groups[i] = (groups[i][0] + groups[j][0], groups[i][1] | groups[j][1])
+        del groups[j]
+
+    batches = [
+        Batch(
+            bumps=group_bumps,
+            rebuilds=group_rebuilds,
+            separate_cost=sum(len(rebuilds[b]) for b in group_bumps),
+        )
+        for group_bumps, group_rebuilds in groups
+    ]
+    batches.sort(key=lambda batch: (len(batch.rebuilds), batch.bumps[0].name))
+    return batches, {b: len(r) for b, r in rebuilds.items()}
+
+
+def print_batches(
+    batches: list[Batch], costs: dict[Bump, int], lockfile: Path
+) -> None:
+    table = Table(
+        box=box.ROUNDED,
+        show_header=True,
+        header_style="bold magenta",
+        title=f"Rebuild cost (from {lockfile})",
+        title_style="bold",
+    )
+    table.add_column("Package", style="bold")
+    table.add_column("Bump")
+    table.add_column("Rebuilds", justify="right")
+    for bump in sorted(costs, key=lambda b: (-costs[b], b.name)):
+        table.add_row(bump.name, f"{bump.current} → {bump.latest}", str(costs[bump]))
+    console.print(table)
+
+    for i, batch in enumerate(batches, start=1):
+        names = ", ".join(f"{b.name}@{b.latest}" for b in batch.bumps)
+        saved = batch.separate_cost - len(batch.rebuilds)
+        note = f", {saved} fewer than one at a time" if saved else ""
+        console.print(
+            f"  [bold]Batch {i}[/bold]: {names} "
+            f"[dim]({len(batch.rebuilds)} spec(s) rebuilt{note})[/dim]"
+        )
+    console.print()
+
+
+async def fetch_all(
+    names: list[str],
+    jobs: int,
+    max_age: int,
+    timeout: float,
+    retries: int,
+    on_result: Callable[[str, str | None], None],
+) -> dict[str, str | None]:
+    """Look up every package on packages.spack.io with up to `jobs` requests in flight.
+
+    `on_result` is called as each lookup completes, so results can be shown
+    while the rest are still in flight.
+    """
+    sem = asyncio.Semaphore(jobs)
+    async with httpx.AsyncClient() as client:
+        tasks = {
+            asyncio.ensure_future(
+                get_latest_safe_version(name, client, sem, max_age, timeout, retries)
+            ): name
+            for name in names
+        }
+        results: dict[str, str | None] = {}
+        pending = set(tasks.keys())
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for fut in done:
+                name = tasks[fut]
+                results[name] = fut.result()
+                on_result(name, results[name])
+    return results
+
+
+def build_table(
+    source: Source,
+    latest_by_name: dict[str, str | None],
+    in_flight: set[str] | None = None,
+) -> tuple[Table, list[dict]]:
     table = Table(
         box=box.ROUNDED,
         show_header=True,
@@ -270,7 +811,10 @@ def build_table(source: Source, latest_by_name: dict[str, str | None]) -> tuple[
         current = source.packages[name]
         latest = latest_by_name.get(name)
         pinned = name in source.no_auto_update
-        status, style = status_style(current, latest, pinned)
+        if in_flight and name in in_flight:
+            status, style = "checking…", "dim"
+        else:
+            status, style = status_style(current, latest, pinned)
         rows.append(
             {
                 "name": name,
@@ -314,7 +858,128 @@ def main(
             "--update", "-u", help="Write latest versions back to their source files."
         ),
     ] = False,
+    max_age: Annotated[
+        int,
+        typer.Option(
+            "--max-age",
+            help="Seconds a cached package entry is trusted before it is revalidated "
+            "with a conditional request (0 always revalidates).",
+            min=0,
+        ),
+    ] = DEFAULT_MAX_AGE,
+    timeout: Annotated[
+        float,
+        typer.Option("--timeout", help="Per-request timeout in seconds.", min=1),
+    ] = DEFAULT_TIMEOUT,
+    retries: Annotated[
+        int,
+        typer.Option(
+            "--retries",
+            help="Retries per package, with exponential backoff, for timeouts, "
+            "connection errors and 429/5xx responses.",
+            min=0,
+        ),
+    ] = DEFAULT_RETRIES,
+    spack_root: Annotated[
+        Path | None,
+        typer.Option(
+            "--spack-root",
+            help="Read versions from this spack checkout (e.g. .local_build/spack, "
+            "as cloned by local_build.py --ci-spack) in one offline pass instead "
+            "of querying packages.spack.io; --validate also concretizes with it.",
+            exists=True,
+            file_okay=False,
+        ),
+    ] = None,
+    validate: Annotated[
+        bool,
+        typer.Option(
+            "--validate",
+            help="Concretize each proposed bump in a scratch environment (with "
+            "--spack-root's spack, else the one on PATH) and report which "
+            "concretize alone and together. With --update, only the bumps that "
+            "concretize together are written.",
+        ),
+    ] = False,
+    validate_jobs: Annotated[
+        int,
+        typer.Option(
+            "--validate-jobs",
+            help="Max concurrent concretizations for --validate.",
+            min=1,
+        ),
+    ] = 4,
+    cxxstd: Annotated[
+        list[str],
+        typer.Option(
+            "--cxxstd",
+            help="C++ standard --validate requires of every package, as "
+            "spack_build.sh does; repeat to check each of several.",
+        ),
+    ] = ["20"],
+    compiler: Annotated[
+        str | None,
+        typer.Option(
+            "--compiler",
+            help="Compiler --validate requires for c and cxx, as the build "
+            "matrix's COMPILER (e.g. gcc@15.2.0). Unconstrained if not given.",
+        ),
+    ] = None,
+    compiler_path: Annotated[
+        Path | None,
+        typer.Option(
+            "--compiler-path",
+            help="Prefix spack compiler find also searches for --validate, as "
+            "the build matrix's COMPILER_PATH.",
+            file_okay=False,
+        ),
+    ] = None,
+    lockfile: Annotated[
+        Path | None,
+        typer.Option(
+            "--lockfile",
+            help="Current spack.lock to rank the bumps by how many specs they rebuild "
+            "and group them into batches that rebuild as little as possible.",
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    batch: Annotated[
+        int | None,
+        typer.Option(
+            "--batch",
+            help="With --lockfile and --update, write only this batch (1 = cheapest).",
+            min=1,
+        ),
+    ] = None,
+    max_batch_size: Annotated[
+        int,
+        typer.Option(
+            "--max-batch-size",
+            help="With --lockfile, put at most this many bumps in one batch (0 = no "
+            "limit). Bumps are batched when they rebuild specs in common, the pairs "
+            "sharing the most first. A bump of something nearly everything depends "
+            "on (e.g. cmake) shares rebuilds with every other bump, so without a "
+            "limit all of them end up in one batch.",
+            min=0,
+        ),
+    ] = 5,
 ) -> None:
+    if batch is not None and lockfile is None:
+        console.print("[red]Error: --batch needs --lockfile[/red]")
+        raise typer.Exit(1)
+
+    spack = None
+    if validate:
+        spack = (
+            str(spack_root / "bin" / "spack") if spack_root else shutil.which("spack")
+        )
+        if spack is None:
+            console.print(
+                "[red]Error: --validate needs spack on PATH or --spack-root[/red]"
+            )
+            raise typer.Exit(1)
+
     sources = discover_sources(spack_yaml, flavors_dir, include_flavors)
     if include_flavors and len(sources) == 1:
         console.print(
@@ -322,37 +987,44 @@ def main(
         )
 
     all_names = sorted({name for source in sources for name in source.packages})
-    console.print(
-        f"\nChecking [bold]{len(all_names)}[/bold] unique packages across "
-        f"[bold]{len(sources)}[/bold] file(s) via [dim]{PACKAGES_URL}[/dim] with up to "
-        f"[bold]{jobs}[/bold] concurrent requests...\n"
-    )
 
-    async def run() -> dict[str, str | None]:
-        sem = asyncio.Semaphore(jobs)
-        async with httpx.AsyncClient() as client:
-            tasks = {
-                asyncio.ensure_future(get_latest_safe_version(name, client, sem)): name
-                for name in all_names
-            }
-            results: dict[str, str | None] = {}
-            completed = 0
-            pending = set(tasks.keys())
-            while pending:
-                done, pending = await asyncio.wait(
-                    pending, return_when=asyncio.FIRST_COMPLETED
-                )
-                for fut in done:
-                    name = tasks[fut]
-                    results[name] = fut.result()
-                    completed += 1
-                    console.print(f"  [{completed}/{len(tasks)}] {name}", end="\r")
-        return results
+    if spack_root is not None:
+        console.print(
+            f"\nChecking [bold]{len(all_names)}[/bold] unique packages across "
+            f"[bold]{len(sources)}[/bold] file(s) via spack at [dim]{spack_root}[/dim]...\n"
+        )
+        latest_by_name = get_latest_versions_from_spack(
+            all_names, spack_root, spack_yaml.resolve().parent
+        )
+    else:
+        console.print(
+            f"\nChecking [bold]{len(all_names)}[/bold] unique packages across "
+            f"[bold]{len(sources)}[/bold] file(s) via [dim]{PACKAGES_URL}[/dim] with up to "
+            f"[bold]{jobs}[/bold] concurrent requests...\n"
+        )
+        latest_by_name: dict[str, str | None] = {}
+        in_flight = set(all_names)
+
+        def render() -> Group:
+            return Group(
+                *(build_table(s, latest_by_name, in_flight)[0] for s in sources),
+                f"[dim]{len(all_names) - len(in_flight)}/{len(all_names)} checked[/dim]",
+            )
 
-    latest_by_name = asyncio.run(run())
-    console.print(" " * 60, end="\r")  # clear progress line
+        # Transient: the live view is replaced by the final tables printed below.
+        with Live(render(), console=console, transient=True) as live:
+
+            def on_result(name: str, latest: str | None) -> None:
+                latest_by_name[name] = latest
+                in_flight.discard(name)
+                live.update(render())
+
+            asyncio.run(
+                fetch_all(all_names, jobs, max_age, timeout, retries, on_result)
+            )
 
     total_outdated = 0
+    bumps: list[Bump] = []
     for source in sources:
         table, rows = build_table(source, latest_by_name)
         console.print(table)
@@ -375,8 +1047,43 @@ def main(
                 f"left alone: {', '.join(r['name'] for r in pinned_rows)}[/dim]"
             )
 
-        if update and updatable_rows:
-            updates = {r["name"]: r["latest"] for r in updatable_rows}
+        bumps += [
+            Bump(source.path, source.kind, r["name"], r["current"], r["latest"])
+            for r in updatable_rows
+        ]
+        console.print()
+
+    if validate and bumps:
+        flavors = [s.path.stem for s in sources if s.kind == "specs"]
+        console.print(
+            f"Concretizing [bold]{len(bumps)}[/bold] proposed bump(s) with up to "
+            f"[bold]{validate_jobs}[/bold] concurrent concretizations...\n"
+        )
+        toolchains = [Toolchain(std, compiler, compiler_path) for std in cxxstd]
+        alone, combined = validate_bumps(
+            bumps, spack, spack_yaml, flavors_dir, flavors, toolchains, validate_jobs
+        )
+        print_validation(bumps, alone, combined)
+        bumps = combined
+
+    if lockfile is not None and bumps:
+        batches, costs = plan_batches(bumps, lockfile, max_batch_size)
+        print_batches(batches, costs, lockfile)
+        if batch is not None:
+            if batch > len(batches):
+                console.print(
+                    f"[red]Error: --batch {batch}, but there are only "
+                    f"{len(batches)} batch(es)[/red]"
+                )
+                raise typer.Exit(1)
+            bumps = batches[batch - 1].bumps
+
+    if update and bumps:
+        for source in sources:
+            source_bumps = [b for b in bumps if b.path == source.path]
+            if not source_bumps:
+                continue
+            updates = {b.name: b.latest for b in source_bumps}
             if source.kind == "yaml":
                 n = update_spack_yaml(source.path, updates)
             else:
@@ -384,8 +1091,8 @@ def main(
             console.print(
                 f"[green]Updated {n} version(s) in [cyan]{source.path}[/cyan].[/green]"
             )
-            for r in updatable_rows:
-                console.print(f"  [bold]{r['name']}[/bold]: {r['current']} → {r['latest']}")
+            for b in source_bumps:
+                console.print(f"  [bold]{b.name}[/bold]: {b.current} → {b.latest}")
         console.print()
 
     if total_outdated == 0:
@@ -10,14 +10,27 @@
 
 import asyncio
 import concurrent.futures
+import contextlib
+import fcntl
+import gzip
 import hashlib
+import io
+import json
 import os
+import queue
+import re
+import shlex
 import shutil
+import stat
 import subprocess
 import sys
 import tarfile
+import tempfile
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, TypeVar
 
 import httpx
 import typer
@@ -35,6 +48,86 @@ from rich.progress import (
 console = Console()
 app = typer.Typer()
 
+# Large enough that handing each chunk to the extraction thread is cheap next
+# to decompressing it; the queue bounds how far the download may run ahead.
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+STREAM_QUEUE_CHUNKS = 16
+
+# Cache layout: every extracted file is stored once under objects/, named by
+# its SHA-256, and each dataset version is a manifest under manifests/ that
+# maps its tree onto those objects.
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+# --verify --repair cannot lock every dataset sharing a damaged object, so it
+# only leaves a marker named after the object's hash under damaged/. Entries
+# using a marked object count as uncached until a locked install fetches the
+# file again and replaces the object.
+DAMAGED_DIR = "damaged"
+# Installers sharing a cache take a per-dataset lock under locks/ while they
+# fill and read its entry, and extract into private directories under tmp/.
+LOCKS_DIR = "locks"
+SCRATCH_DIR = "tmp"
+# How often a partial download's sidecar is brought up to date; at most this
+# much has to be fetched again after a crash.
+SIDECAR_INTERVAL = 8 << 20
+
+# Artifacts as pushed by publish_geant4_data.py; ``G4NDL4.7.1`` -> name=``G4NDL``
+# version=``4.7.1``, the version being the trailing run of dot-separated integers.
+LAYER_MEDIA_TYPE = "application/vnd.acts.geant4-dataset.tar+gzip"
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+# A split artifact (publish_geant4_data.py --split-size) names in this manifest
+# annotation the directory its layers are extracted into, side by side; up to
+# LAYER_STREAMS of its layers are downloaded at once.
+SPLIT_ROOT_ANNOTATION = "org.acts-project.geant4-data.root"
+LAYER_STREAMS = 4
+# Named subsets for --only, by the NAME field of geant4-config's dataset_list.
+# Every Geant4 run reads G4ENSDFSTATE during initialization, so each profile
+# includes it; datasets a release does not ship are skipped.
+PROFILES = {
+    "em": ["G4ENSDFSTATE", "G4EMLOW"],
+    "ftfp_bert": ["G4ENSDFSTATE", "G4EMLOW", "G4PARTICLEXS", "PhotonEvaporation"],
+    "hp": [
+        "G4ENSDFSTATE",
+        "G4EMLOW",
+        "G4PARTICLEXS",
+        "PhotonEvaporation",
+        "RadioactiveDecay",
+        "G4NDL",
+    ],
+}
+# The shim written by --shim re-runs this script through uv, which resolves
+# the inline script dependencies.
+SHIM_TEMPLATE = """#!/bin/sh
+# Install Geant4 datasets on demand, e.g. `{shim} G4NDL` or `{shim} hp`.
+# Generated by download_geant4_datasets.py --shim; datasets already installed
+# are skipped, and concurrent calls share the cache safely.
+set -e
+if [ "$#" -eq 0 ]; then
+    echo "usage: $0 DATASET|PROFILE..." >&2
+    exit 2
+fi
+IFS=,
+exec uv run --script {args} --only "$*"
+"""
+_NAME_VERSION_RE = re.compile(r"^(?P<name>.+?)(?P<version>\d+(?:\.\d+)*)$")
+# Installing is dominated by link()/stat() syscalls on many small files, which
+# release the GIL; a handful of threads keeps the filesystem busy without
+# piling up on the directory locks.
+LINK_WORKERS = 8
+LINK_BATCH_SIZE = 256
+# Differences listed per dataset by --verify before summarizing the rest
+VERIFY_REPORT_LIMIT = 10
+
+
+@dataclass(frozen=True)
+class DownloadOptions:
+    """How dataset tarballs are fetched; the same for every dataset in a run."""
+
+    spool: bool = False
+    resume: bool = True
+    segments: int = 1
+    segment_min_size: int = 100 << 20
+
 
 def find_geant4_config() -> Path:
     """Find geant4-config in PATH."""
@@ -87,6 +180,42 @@ def parse_datasets(config_path: Path) -> list[dict]:
     return datasets
 
 
+def select_datasets(datasets: list[dict], only: str) -> list[dict]:
+    """Restrict ``datasets`` to a comma-separated list of names and profiles."""
+    by_name = {ds["name"].lower(): ds for ds in datasets}
+    wanted: set[str] = set()
+    for item in filter(None, (i.strip() for i in only.split(","))):
+        if item.lower() in PROFILES:
+            members = (n.lower() for n in PROFILES[item.lower()])
+            wanted.update(n for n in members if n in by_name)
+        elif item.lower() in by_name:
+            wanted.add(item.lower())
+        else:
+            console.print(
+                f"[red]Error: unknown dataset or profile {item!r}; datasets: "
+                f"{', '.join(ds['name'] for ds in datasets)}; profiles: "
+                f"{', '.join(PROFILES)}[/red]"
+            )
+            raise typer.Exit(1)
+    return [ds for ds in datasets if ds["name"].lower() in wanted]
+
+
+def write_shim(
+    shim: Path, config_path: Path, cache_dir: Path, source: str | None
+) -> None:
+    """Write a script that installs further datasets from the same setup."""
+    args = [Path(__file__).resolve(), "--config", config_path.resolve()]
+    args += ["--cache-dir", cache_dir.resolve()]
+    if source is not None:
+        args += ["--source", source]
+    shim.write_text(
+        SHIM_TEMPLATE.format(
+            shim=shim.name, args=" ".join(shlex.quote(str(a)) for a in args)
+        )
+    )
+    shim.chmod(0o755)
+
+
 def get_dataset_url(config_path: Path) -> str:
     """Get the base URL for datasets from geant4-config."""
     with open(config_path) as f:
@@ -104,30 +233,374 @@ def get_dataset_url(config_path: Path) -> str:
     return "https://cern.ch/geant4-data/datasets"
 
 
-def verify_md5(filepath: Path, expected_md5: str) -> bool:
-    """Verify MD5 checksum of a file."""
-    md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            md5.update(chunk)
-    return md5.hexdigest() == expected_md5
+def split_name_version(dirname: str) -> tuple[str, str] | None:
+    """Split a versioned dataset directory name into (name, version)."""
+    match = _NAME_VERSION_RE.match(dirname)
+    if not match:
+        return None
+    return match.group("name"), match.group("version")
+
+
+T = TypeVar("T")
 
 
-def hardlink_tree(src: Path, dst: Path) -> None:
-    """Recursively hard-link all files from src into dst.
+class OciSource:
+    """Dataset tarballs pushed to an OCI registry by publish_geant4_data.py.
 
-    Falls back to copying if hard-linking fails (e.g. cross-filesystem).
+    ``source`` is ``oci://<registry>/<repo-prefix>``; the dataset in
+    ``G4NDL4.7.1`` is the artifact ``<repo-prefix>/g4ndl:4.7.1``. Pulls are
+    anonymous, with a bearer token requested per repository on the first 401
+    and reused after that, until another 401 shows it has expired.
     """
-    dst.mkdir(parents=True, exist_ok=True)
-    for entry in src.iterdir():
-        target = dst / entry.name
-        if entry.is_dir():
-            hardlink_tree(entry, target)
-        else:
-            try:
-                os.link(entry, target)
-            except OSError:
-                shutil.copy2(entry, target)
+
+    def __init__(self, client: httpx.AsyncClient, source: str) -> None:
+        host, _, prefix = source.removeprefix("oci://").partition("/")
+        # Like oras and docker, talk plain HTTP only to a registry on this machine
+        plain = host.split(":")[0] in ("localhost", "127.0.0.1")
+        self.client = client
+        self.base_url = f"{'http' if plain else 'https'}://{host}"
+        self.prefix = prefix.strip("/")
+        self.tokens: dict[str, str] = {}
+
+    def ref(self, dataset_dir_name: str) -> tuple[str, str] | None:
+        """Repository and tag of a dataset, if its name carries a version."""
+        parsed = split_name_version(dataset_dir_name)
+        if parsed is None:
+            return None
+        name, version = parsed
+        return f"{self.prefix}/{name.lower()}", version
+
+    def headers(self, repo: str) -> dict[str, str]:
+        token = self.tokens.get(repo)
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def blob_url(self, repo: str, digest: str) -> str:
+        return f"{self.base_url}/v2/{repo}/blobs/{digest}"
+
+    async def authenticate(self, repo: str, challenge: str) -> None:
+        scheme, _, params = challenge.partition(" ")
+        if scheme.lower() != "bearer":
+            raise RuntimeError(f"unsupported registry auth scheme {scheme!r}")
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        response = await self.client.get(
+            fields["realm"],
+            params={
+                "service": fields.get("service", ""),
+                "scope": fields.get("scope", f"repository:{repo}:pull"),
+            },
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.tokens[repo] = body.get("token") or body["access_token"]
+
+    async def authorized(
+        self, repo: str, fetch: Callable[[dict[str, str]], Awaitable[T]]
+    ) -> T:
+        """Run ``fetch`` with the auth headers of ``repo``, once more after a 401.
+
+        A 401 means there is no token yet or it expired, e.g. while the
+        earlier layers of a large split artifact were downloading. A new
+        one is requested, unless a concurrent fetch already did so.
+        """
+        sent = self.headers(repo)
+        try:
+            return await fetch(sent)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 401:
+                raise
+            if self.headers(repo) == sent:
+                challenge = e.response.headers.get("www-authenticate", "")
+                await self.authenticate(repo, challenge)
+        return await fetch(self.headers(repo))
+
+    async def get(
+        self, repo: str, path: str, headers: dict[str, str]
+    ) -> httpx.Response:
+        url = f"{self.base_url}/v2/{repo}/{path}"
+
+        async def fetch(auth: dict[str, str]) -> httpx.Response:
+            response = await self.client.get(
+                url, headers=headers | auth, follow_redirects=True
+            )
+            response.raise_for_status()
+            return response
+
+        return await self.authorized(repo, fetch)
+
+    async def resolve(
+        self, dataset_dir_name: str
+    ) -> tuple[str, list[dict], str | None]:
+        """Look up a dataset's artifact.
+
+        Returns its repository, its layers and, for a split artifact, the
+        directory the layers are extracted into (``None`` for the single
+        layer of an unsplit one).
+        """
+        ref = self.ref(dataset_dir_name)
+        if ref is None:
+            raise ValueError(f"cannot derive an OCI tag from {dataset_dir_name}")
+        repo, tag = ref
+        response = await self.get(repo, f"manifests/{tag}", {"Accept": OCI_MANIFEST})
+        manifest = response.json()
+        root = manifest.get("annotations", {}).get(SPLIT_ROOT_ANNOTATION)
+        layers = manifest.get("layers", [])
+        ours = [layer for layer in layers if layer.get("mediaType") == LAYER_MEDIA_TYPE]
+        if root is not None:
+            if root != dataset_dir_name:
+                raise ValueError(f"{repo}:{tag} unpacks to {root}")
+            # Every part is needed to reassemble the dataset
+            if not ours or len(ours) != len(layers):
+                raise ValueError(f"{repo}:{tag} has layers this script cannot read")
+            return repo, layers, root
+        if len(ours) != 1:
+            raise ValueError(f"{repo}:{tag} has {len(ours)} dataset layers")
+        return repo, ours, None
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over chunks fed in from another thread.
+
+    Lets ``tarfile`` extract a download as it arrives: the download coroutine
+    feeds chunks in, the extraction thread reads them out. ``feed`` blocks
+    once ``maxsize`` chunks are queued, so a slow extraction throttles the
+    download instead of buffering the whole tarball in memory.
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_CHUNKS):
+        super().__init__()
+        self._queue: queue.Queue[bytes] = queue.Queue(maxsize)
+        self._buffer = b""
+        self._eof = False
+
+    def feed(self, chunk: bytes) -> None:
+        if chunk:
+            self._queue.put(chunk)
+
+    def finish(self) -> None:
+        """Signal the end of the data (after the last chunk, or on failure)."""
+        self._queue.put(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            chunk = self._queue.get()
+            if not chunk:
+                self._eof = True
+            self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def drain(self) -> None:
+        """Consume and discard the rest, so a blocked ``feed`` can finish."""
+        while self.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+
+
+def object_path(cache_dir: Path, digest: str) -> Path:
+    return cache_dir / OBJECTS_DIR / digest[:2] / digest[2:]
+
+
+def manifest_path(cache_dir: Path, dataset_dir_name: str) -> Path:
+    return cache_dir / MANIFESTS_DIR / f"{dataset_dir_name}.json"
+
+
+def load_manifest(cache_dir: Path, dataset_dir_name: str) -> dict | None:
+    try:
+        return json.loads(manifest_path(cache_dir, dataset_dir_name).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def damaged_objects(cache_dir: Path) -> set[str]:
+    try:
+        return set(os.listdir(cache_dir / DAMAGED_DIR))
+    except FileNotFoundError:
+        return set()
+
+
+def mark_damaged(cache_dir: Path, digest: str) -> None:
+    (cache_dir / DAMAGED_DIR).mkdir(parents=True, exist_ok=True)
+    (cache_dir / DAMAGED_DIR / digest).touch()
+
+
+def is_cached(cache_dir: Path, dataset_dir_name: str, md5: str) -> bool:
+    """True if the cache holds the dataset extracted from the tarball ``md5``.
+
+    An entry using an object marked as damaged does not count.
+    """
+    manifest = load_manifest(cache_dir, dataset_dir_name)
+    if manifest is None or manifest["md5"] != md5:
+        return False
+    damaged = damaged_objects(cache_dir)
+    return not any(e["hash"] in damaged for e in manifest["files"])
+
+
+def ingest_tree(
+    src_dir: Path, cache_dir: Path, dataset_dir_name: str, md5: str
+) -> None:
+    """Move the files of ``src_dir`` into the object store and write its manifest.
+
+    Each file is stored once under its SHA-256, so consecutive versions of a
+    dataset that ship identical files share them; a file whose object already
+    exists is simply dropped, unless it is marked as damaged: then the new
+    file replaces it, atomically, so that installs linking it concurrently
+    get either the old or the new copy whole. The manifest lists every directory, file (with
+    its object hash, size and mode) and symlink, which is all
+    ``install_from_cache`` needs to rebuild the tree. It is written last, so
+    an entry only counts as cached once all its objects are in place.
+    """
+    damaged = damaged_objects(cache_dir)
+    dirs: list[str] = []
+    files: list[dict] = []
+    symlinks: list[dict] = []
+    for root, dirnames, filenames in os.walk(src_dir):
+        root_path = Path(root)
+        rel_root = root_path.relative_to(src_dir)
+        dirs.append(rel_root.as_posix())
+        for name in sorted(dirnames):
+            entry = root_path / name
+            if entry.is_symlink():
+                rel = (rel_root / name).as_posix()
+                symlinks.append({"path": rel, "target": os.readlink(entry)})
+        for name in sorted(filenames):
+            entry = root_path / name
+            rel = (rel_root / name).as_posix()
+            if entry.is_symlink():
+                symlinks.append({"path": rel, "target": os.readlink(entry)})
+                continue
+            with open(entry, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            st = entry.stat()
+            obj = object_path(cache_dir, digest)
+            if obj.exists() and digest not in damaged:
+                entry.unlink()
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(entry, obj)
+                if digest in damaged:
+                    (cache_dir / DAMAGED_DIR / digest).unlink(missing_ok=True)
+            files.append(
+                {
+                    "path": rel,
+                    "hash": digest,
+                    "size": st.st_size,
+                    "mode": st.st_mode & 0o777,
+                }
+            )
+
+    manifest = {
+        "md5": md5,
+        "dirs": sorted(dirs),
+        "files": files,
+        "symlinks": symlinks,
+    }
+    target = manifest_path(cache_dir, dataset_dir_name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest))
+    tmp.replace(target)
+
+
+def migrate_legacy_entry(cache_dir: Path, dataset_dir_name: str) -> bool:
+    """Fold a cache entry of the old one-directory-per-dataset layout into the store.
+
+    Caches written before the object store kept ``<dataset_dir_name>/`` next
+    to a ``<dataset_dir_name>.md5`` marker. Those are ingested in place rather
+    than downloaded again. Returns True if an entry was migrated.
+    """
+    legacy_dir = cache_dir / dataset_dir_name
+    legacy_marker = cache_dir / f"{dataset_dir_name}.md5"
+    if not (legacy_dir.is_dir() and legacy_marker.exists()):
+        return False
+    md5 = legacy_marker.read_text().strip()
+    ingest_tree(legacy_dir, cache_dir, dataset_dir_name, md5)
+    legacy_marker.unlink()
+    shutil.rmtree(legacy_dir)
+    return True
+
+
+def lock_path(cache_dir: Path, dataset_dir_name: str) -> Path:
+    return cache_dir / LOCKS_DIR / f"{dataset_dir_name}.lock"
+
+
+@contextlib.asynccontextmanager
+async def dataset_lock(
+    cache_dir: Path, dataset_dir_name: str, on_wait: Callable[[], None]
+) -> AsyncIterator[None]:
+    """Hold the cache-wide lock of one dataset, across processes.
+
+    Whoever holds it may download, extract and install the dataset; other
+    installers sharing the cache wait (calling ``on_wait`` first) and then
+    usually find it cached. The lock is an flock on a file under locks/, so
+    it is released by the kernel if its holder dies.
+    """
+    path = lock_path(cache_dir, dataset_dir_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            on_wait()
+            await loop.run_in_executor(None, fcntl.flock, f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def scratch_dir(cache_dir: Path, dataset_dir_name: str) -> Path:
+    """Create a fresh directory to extract one download of a dataset into."""
+    parent = cache_dir / SCRATCH_DIR / dataset_dir_name
+    parent.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=parent))
+
+
+def clear_scratch(cache_dir: Path, dataset_dir_name: str) -> None:
+    """Remove extractions left behind by crashed runs; needs the dataset lock."""
+    shutil.rmtree(cache_dir / SCRATCH_DIR / dataset_dir_name, ignore_errors=True)
+
+
+def extract_stream(stream: ChunkStream, tmp_extract: Path) -> Path:
+    """Extract a gzipped tarball read from ``stream`` into a scratch directory.
+
+    Runs in a thread alongside the download. Nothing is visible in the cache
+    until ``commit_to_cache`` is called, which the caller only does once the
+    MD5 of the streamed bytes has checked out. Returns the scratch directory.
+    The layers of a split artifact extract into the same directory at once,
+    so parent directories are made here, race-free, rather than by tarfile.
+    """
+
+    def make_parents(member: tarfile.TarInfo, path: str) -> tarfile.TarInfo:
+        member = tarfile.data_filter(member, path)
+        parent = os.path.dirname(member.name)
+        if parent:
+            os.makedirs(os.path.join(path, parent), exist_ok=True)
+        return member
+
+    try:
+        # GzipFile reads every member of the multi-member streams that
+        # publish_geant4_data.py writes, where tarfile's "r|gz" stops after one
+        with (
+            gzip.GzipFile(fileobj=stream) as gz,
+            tarfile.open(fileobj=gz, mode="r|") as tar,
+        ):
+            tar.extractall(tmp_extract, filter=make_parents)
+        return tmp_extract
+    finally:
+        stream.drain()
+
+
+def commit_to_cache(
+    tmp_extract: Path, cache_dir: Path, dataset_dir_name: str, md5: str
+) -> None:
+    """Ingest an extracted dataset into the cache's object store."""
+    ingest_tree(tmp_extract / dataset_dir_name, cache_dir, dataset_dir_name, md5)
+    shutil.rmtree(tmp_extract, ignore_errors=True)
 
 
 def extract_to_cache(
@@ -135,33 +608,18 @@ def extract_to_cache(
 ) -> tuple[bool, str]:
     """Extract tarball into the cache directory (runs in process pool)."""
     try:
-        cache_dataset_dir = cache_dir / dataset_dir_name
-        md5_marker = cache_dir / f"{dataset_dir_name}.md5"
-
         # Check if cache already has this exact version
-        if cache_dataset_dir.exists() and md5_marker.exists():
-            if md5_marker.read_text().strip() == md5:
-                tarball_path.unlink(missing_ok=True)
-                return True, f"Cache hit for {dataset_dir_name}"
+        if is_cached(cache_dir, dataset_dir_name, md5):
+            tarball_path.unlink(missing_ok=True)
+            return True, f"Cache hit for {dataset_dir_name}"
 
-        # Extract into a temporary directory next to cache, then atomically rename
-        tmp_extract = cache_dir / f"{dataset_dir_name}.extracting"
-        if tmp_extract.exists():
-            shutil.rmtree(tmp_extract)
-        tmp_extract.mkdir(parents=True, exist_ok=True)
+        # Extract into a scratch directory, then move the files into the cache
+        tmp_extract = scratch_dir(cache_dir, dataset_dir_name)
 
         with tarfile.open(tarball_path, "r:gz") as tar:
             tar.extractall(tmp_extract, filter="data")
 
-        src_dir = tmp_extract / dataset_dir_name
-
-        if cache_dataset_dir.exists():
-            shutil.rmtree(cache_dataset_dir)
-        shutil.move(str(src_dir), str(cache_dataset_dir))
-        shutil.rmtree(tmp_extract, ignore_errors=True)
-
-        # Write MD5 marker so we know this cache entry is valid
-        md5_marker.write_text(md5)
+        commit_to_cache(tmp_extract, cache_dir, dataset_dir_name, md5)
 
         tarball_path.unlink(missing_ok=True)
 
@@ -170,23 +628,846 @@ def extract_to_cache(
         return False, f"Failed to extract to cache: {e}"
 
 
+def scan_tree(
+    root: Path,
+) -> tuple[set[str], dict[str, os.DirEntry], dict[str, str]]:
+    """Walk an installed tree with os.scandir.
+
+    Returns its directories, regular files (as their DirEntry, whose stat is
+    cached) and symlinks (with their targets), all relative to ``root``.
+    """
+    dirs: set[str] = set()
+    files: dict[str, os.DirEntry] = {}
+    symlinks: dict[str, str] = {}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_symlink():
+                    symlinks[rel] = os.readlink(entry.path)
+                elif entry.is_dir():
+                    dirs.add(rel)
+                    stack.append(rel)
+                else:
+                    files[rel] = entry
+    return dirs, files, symlinks
+
+
+def same_content(existing: os.DirEntry, obj_st: os.stat_result, mode: int) -> bool:
+    """Whether an installed file already is (or is a faithful copy of) an object.
+
+    ``mode`` is the permission bits the dataset ships the file with.
+    """
+    st = existing.stat(follow_symlinks=False)
+    if st.st_mode & 0o777 != mode:
+        return False
+    if (st.st_ino, st.st_dev) == (obj_st.st_ino, obj_st.st_dev):
+        return True
+    # Copies made by shutil.copy2 when linking failed keep the object's mtime
+    return st.st_size == obj_st.st_size and st.st_mtime_ns == obj_st.st_mtime_ns
+
+
+def link_batch(
+    cache_dir: Path, dest_dir: Path, batch: list[tuple[dict, os.DirEntry | None]]
+) -> tuple[int, list[dict]]:
+    """Link one batch of manifest files into place.
+
+    An object keeps the mode of the file it was first ingested from, and a
+    hard link cannot have another. A file the dataset ships with a
+    different mode (say, executable in one version only) is therefore
+    copied and given its own. Returns how many files changed and the
+    install-manifest records (the cache entry plus the installed size and
+    mtime) for the whole batch.
+    """
+    changed = 0
+    records = []
+    for entry, existing in batch:
+        obj = object_path(cache_dir, entry["hash"])
+        obj_st = obj.stat()
+        target = dest_dir / entry["path"]
+        if existing is None or not same_content(existing, obj_st, entry["mode"]):
+            if existing is not None:
+                target.unlink()
+            linked = False
+            if obj_st.st_mode & 0o777 == entry["mode"]:
+                with contextlib.suppress(OSError):
+                    os.link(obj, target)
+                    linked = True
+            if not linked:
+                shutil.copy2(obj, target)
+                os.chmod(target, entry["mode"])
+            changed += 1
+        st = target.stat()
+        records.append({**entry, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return changed, records
+
+
+def install_manifest_path(dest_dir: Path) -> Path:
+    """Where the record of an installed dataset lives, next to (not in) it."""
+    return dest_dir.parent / f".{dest_dir.name}.install.json"
+
+
+def load_install_manifest(dest_dir: Path) -> dict | None:
+    try:
+        return json.loads(install_manifest_path(dest_dir).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def is_installed(dest_dir: Path, md5: str) -> bool:
+    """True if ``dest_dir`` was completely installed from the tarball ``md5``."""
+    manifest = load_install_manifest(dest_dir)
+    return manifest is not None and manifest["md5"] == md5 and dest_dir.is_dir()
+
+
+def check_batch(dest_dir: Path, batch: list[dict], hashes: bool) -> list[dict]:
+    """Compare one batch of installed files against their install records."""
+    problems = []
+    for entry in batch:
+        target = dest_dir / entry["path"]
+        try:
+            st = target.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            problems.append({**entry, "reason": "missing"})
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            problems.append({**entry, "reason": "not a regular file"})
+        elif st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+            problems.append({**entry, "reason": "size or mtime changed"})
+        elif st.st_mode & 0o777 != entry["mode"]:
+            problems.append({**entry, "reason": "mode changed"})
+        elif hashes:
+            with open(target, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if digest != entry["hash"]:
+                problems.append({**entry, "reason": "content changed"})
+    return problems
+
+
+def verify_install(
+    cache_dir: Path, dest_dir: Path, hashes: bool, repair: bool
+) -> list[str]:
+    """Check an installed dataset against its install manifest (runs in process pool).
+
+    Every file's size, mtime and mode are compared, and with ``hashes`` its
+    SHA-256 too. Returns a description of each difference. With ``repair``, the
+    differing files and the install manifest are removed, so that the regular
+    install pass re-links just those files; a file whose content changed
+    while still hard-linked to its cache object means the object is damaged
+    as well. It is only marked as such: other installers may be linking it
+    under their own dataset locks, which this does not hold. Every dataset
+    using it is then fetched again by its next (locked) install.
+    """
+    manifest = load_install_manifest(dest_dir)
+    if manifest is None:
+        return ["no install manifest"]
+    if not dest_dir.is_dir():
+        return ["install directory is missing"]
+
+    files = manifest["files"]
+    batches = [
+        files[i : i + LINK_BATCH_SIZE] for i in range(0, len(files), LINK_BATCH_SIZE)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(LINK_WORKERS) as pool:
+        problems = [
+            p
+            for batch_problems in pool.map(
+                lambda b: check_batch(dest_dir, b, hashes), batches
+            )
+            for p in batch_problems
+        ]
+
+    have_dirs, have_files, have_links = scan_tree(dest_dir)
+    want_files = {e["path"] for e in files}
+    want_links = {e["path"]: e["target"] for e in manifest["symlinks"]}
+    messages = [f"{p['path']}: {p['reason']}" for p in problems]
+    messages += [
+        f"{rel}: not part of the dataset"
+        for rel in sorted(
+            (have_files.keys() - want_files) | (have_dirs - set(manifest["dirs"]))
+        )
+    ]
+    messages += [
+        f"{rel}: symlink missing or changed"
+        for rel, target in want_links.items()
+        if have_links.get(rel) != target
+    ]
+
+    if messages and repair:
+        install_manifest_path(dest_dir).unlink(missing_ok=True)
+        for p in problems:
+            target = dest_dir / p["path"]
+            obj = object_path(cache_dir, p["hash"])
+            if p["reason"] == "content changed" and obj.exists():
+                if os.path.samefile(obj, target):
+                    mark_damaged(cache_dir, p["hash"])
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            else:
+                target.unlink(missing_ok=True)
+    return messages
+
+
 def install_from_cache(
     cache_dir: Path, dataset_dir_name: str, dest_dir: Path
 ) -> tuple[bool, str]:
-    """Hard-link (or copy) a cached dataset into the final location (runs in process pool)."""
+    """Materialize a cached dataset at its final location (runs in process pool).
+
+    The destination is brought in line with the dataset's manifest rather than
+    rebuilt: stray entries are removed, directories created up front, and the
+    files that are not already links to their objects are hard-linked (or
+    copied if linking fails, e.g. cross-filesystem, or the object's mode
+    differs) from a thread pool.
+    An install manifest recording every file's size, mtime and hash is
+    written once the tree is complete.
+    """
     try:
-        cache_dataset_dir = cache_dir / dataset_dir_name
+        manifest = load_manifest(cache_dir, dataset_dir_name)
+        if manifest is None:
+            return False, f"No cache manifest for {dataset_dir_name}"
 
+        start = time.perf_counter()
         dest_dir.parent.mkdir(parents=True, exist_ok=True)
+        record = install_manifest_path(dest_dir)
+        record.unlink(missing_ok=True)
+
+        if dest_dir.is_dir() and not dest_dir.is_symlink():
+            have_dirs, have_files, have_links = scan_tree(dest_dir)
+        else:
+            if dest_dir.is_symlink() or dest_dir.exists():
+                dest_dir.unlink()
+            dest_dir.mkdir()
+            have_dirs, have_files, have_links = set(), {}, {}
+
+        want_dirs = set(manifest["dirs"])
+        want_files = {e["path"] for e in manifest["files"]}
+        want_links = {e["path"]: e["target"] for e in manifest["symlinks"]}
+
+        # Remove whatever the manifest does not describe, deepest first so
+        # removing a directory never pulls the rug from under a later entry
+        stray_files = have_files.keys() - want_files
+        stray_links = {r for r, t in have_links.items() if want_links.get(r) != t}
+        stray_dirs = have_dirs - want_dirs
+        for rel in sorted(stray_files | stray_links, reverse=True):
+            (dest_dir / rel).unlink()
+        for rel in sorted(stray_dirs, reverse=True):
+            shutil.rmtree(dest_dir / rel, ignore_errors=True)
+        removed = len(stray_files) + len(stray_links) + len(stray_dirs)
+
+        for rel in sorted(want_dirs - have_dirs):
+            (dest_dir / rel).mkdir(parents=True, exist_ok=True)
+
+        work = [(e, have_files.get(e["path"])) for e in manifest["files"]]
+        batches = [
+            work[i : i + LINK_BATCH_SIZE]
+            for i in range(0, len(work), LINK_BATCH_SIZE)
+        ]
+        if len(batches) <= 1:
+            results = [link_batch(cache_dir, dest_dir, b) for b in batches]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(LINK_WORKERS) as pool:
+                results = list(
+                    pool.map(lambda b: link_batch(cache_dir, dest_dir, b), batches)
+                )
+        changed = sum(n for n, _ in results)
+
+        for rel, target in want_links.items():
+            if have_links.get(rel) != target:
+                (dest_dir / rel).symlink_to(target)
+
+        installed = {
+            **manifest,
+            "files": [r for _, records in results for r in records],
+        }
+        tmp = record.with_suffix(".tmp")
+        tmp.write_text(json.dumps(installed))
+        tmp.replace(record)
+
+        elapsed = time.perf_counter() - start
+        if changed == 0 and removed == 0:
+            return True, f"up to date, {len(work)} files checked"
+        rate = changed / elapsed if elapsed > 0 else float(changed)
+        return True, f"{changed}/{len(work)} files linked, {rate:,.0f} files/s"
+    except Exception as e:
+        return False, f"Failed to install from cache: {e}"
+
+
+def part_paths(cache_dir: Path, filename: str) -> tuple[Path, Path]:
+    """Partial download of ``filename`` and its JSON sidecar."""
+    return cache_dir / f"{filename}.part", cache_dir / f"{filename}.part.json"
+
+
+def load_sidecar(sidecar: Path, url: str) -> dict | None:
+    """Return the saved state of a partial download of ``url``, if any.
+
+    The state records the validators (ETag/Last-Modified) the bytes were
+    fetched under, the total size, and per byte range how much has arrived:
+    ``segments`` is a list of ``[start, end, received]``, a single range for
+    a sequential download.
+    """
+    try:
+        state = json.loads(sidecar.read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url:
+        return None
+    if not (state.get("etag") or state.get("last_modified")):
+        return None
+    return state
+
+
+def save_sidecar(sidecar: Path, state: dict) -> None:
+    tmp = sidecar.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(sidecar)
+
+
+def discard_partial(cache_dir: Path, filename: str) -> None:
+    for path in part_paths(cache_dir, filename):
+        path.unlink(missing_ok=True)
+
+
+def file_md5(path: Path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
 
-        if dest_dir.exists():
-            shutil.rmtree(dest_dir)
 
-        hardlink_tree(cache_dataset_dir, dest_dir)
+def validators(response: httpx.Response) -> dict:
+    return {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+    }
 
-        return True, f"Successfully installed {dataset_dir_name}"
+
+def if_range(state: dict) -> str:
+    """If-Range value: the server only honours Range if the file is unchanged."""
+    return state["etag"] or state["last_modified"]
+
+
+def total_size(response: httpx.Response) -> int | None:
+    """Size of the whole file, from Content-Range on a 206 else Content-Length."""
+    content_range = response.headers.get("content-range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    if "content-length" in response.headers:
+        return int(response.headers["content-length"])
+    return None
+
+
+async def download_sequential(
+    client: httpx.AsyncClient,
+    url: str,
+    cache_dir: Path,
+    filename: str,
+    sink: ChunkStream | None,
+    progress: Progress,
+    task_id: TaskID,
+    resume: bool,
+    headers: dict[str, str] | None = None,
+    algorithm: str = "md5",
+) -> str:
+    """Download ``url`` in one stream and return the digest of its bytes.
+
+    Each chunk is hashed (MD5 unless ``algorithm`` says otherwise) and, if
+    given, handed to ``sink`` as it arrives. ``headers`` are sent along, e.g.
+    for registry authentication. With
+    ``resume``, the bytes are also written to ``<filename>.part`` next to a
+    sidecar recording progress and validators, and a partial file left by an
+    earlier attempt is continued with a Range request (If-Range guarded). The
+    bytes already on disk are replayed into the hash and ``sink`` first, so a
+    resumed download looks the same as an uninterrupted one to the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    part, sidecar = part_paths(cache_dir, filename)
+    state = load_sidecar(sidecar, url) if resume else None
+    offset = 0
+    headers = dict(headers or {})
+    if state is not None and part.exists() and len(state["segments"]) == 1:
+        offset = min(part.stat().st_size, state["segments"][0][2])
+        if state.get("size") is not None and offset >= state["size"]:
+            # Complete but never committed: a Range past the end would be
+            # refused, so fetch it again from the start.
+            offset = 0
+        if offset:
+            headers |= {"Range": f"bytes={offset}-", "If-Range": if_range(state)}
+
+    md5 = hashlib.new(algorithm)
+    async with client.stream(
+        "GET", url, headers=headers, follow_redirects=True
+    ) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            # Fresh start: nothing saved, or the file changed on the server.
+            offset = 0
+            state = {"url": url, **validators(response)}
+        size = total_size(response)
+        state["size"] = size
+        state["segments"] = [[0, size, offset]]
+        progress.update(task_id, total=size or 0, completed=offset)
+
+        f = None
+        if resume:
+            f = open(part, "r+b" if offset else "wb")
+        try:
+            if offset:
+                f.seek(0)
+                remaining = offset
+                while remaining:
+                    chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    md5.update(chunk)
+                    if sink is not None:
+                        await loop.run_in_executor(None, sink.feed, chunk)
+                f.seek(offset)
+                f.truncate()
+
+            received = offset
+            unsaved = 0
+            async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                md5.update(chunk)
+                if f is not None:
+                    f.write(chunk)
+                if sink is not None:
+                    await loop.run_in_executor(None, sink.feed, chunk)
+                received += len(chunk)
+                unsaved += len(chunk)
+                progress.update(task_id, completed=received)
+                if f is not None and unsaved >= SIDECAR_INTERVAL:
+                    f.flush()
+                    state["segments"][0][2] = received
+                    save_sidecar(sidecar, state)
+                    unsaved = 0
+        finally:
+            if f is not None:
+                f.close()
+                state["segments"][0][2] = part.stat().st_size
+                save_sidecar(sidecar, state)
+    return md5.hexdigest()
+
+
+async def download_segmented(
+    client: httpx.AsyncClient,
+    url: str,
+    cache_dir: Path,
+    filename: str,
+    head: httpx.Response,
+    segments: int,
+    progress: Progress,
+    task_id: TaskID,
+) -> Path:
+    """Download ``url`` as ``segments`` concurrent byte ranges into a .part file.
+
+    Progress per range is kept in the sidecar, so an interrupted download
+    resumes every range where it stopped. The ranges arrive out of order, so
+    the caller hashes and extracts the finished file afterwards.
+    """
+    part, sidecar = part_paths(cache_dir, filename)
+    size = int(head.headers["content-length"])
+    state = load_sidecar(sidecar, url)
+    if (
+        state is None
+        or state.get("size") != size
+        or len(state["segments"]) != segments
+        or state.get("etag") != head.headers.get("etag")
+        or state.get("last_modified") != head.headers.get("last-modified")
+        or not part.exists()
+    ):
+        step = -(-size // segments)
+        state = {
+            "url": url,
+            **validators(head),
+            "size": size,
+            "segments": [
+                [start, min(start + step, size), 0] for start in range(0, size, step)
+            ],
+        }
+        with open(part, "wb") as f:
+            f.truncate(size)
+        save_sidecar(sidecar, state)
+
+    def done() -> int:
+        return sum(received for _, _, received in state["segments"])
+
+    progress.update(task_id, total=size, completed=done())
+
+    async def fetch_range(segment: list[int]) -> None:
+        start, end, received = segment
+        if start + received >= end:
+            return
+        headers = {
+            "Range": f"bytes={start + received}-{end - 1}",
+            "If-Range": if_range(state),
+        }
+        async with client.stream(
+            "GET", url, headers=headers, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                discard_partial(cache_dir, filename)
+                raise RuntimeError(f"{url} changed on the server, restarting it")
+            with open(part, "r+b") as f:
+                f.seek(start + received)
+                unsaved = 0
+                try:
+                    async for chunk in response.aiter_bytes(
+                        chunk_size=DOWNLOAD_CHUNK_SIZE
+                    ):
+                        f.write(chunk)
+                        segment[2] += len(chunk)
+                        unsaved += len(chunk)
+                        progress.update(task_id, completed=done())
+                        if unsaved >= SIDECAR_INTERVAL:
+                            f.flush()
+                            save_sidecar(sidecar, state)
+                            unsaved = 0
+                finally:
+                    f.flush()
+                    save_sidecar(sidecar, state)
+
+    await asyncio.gather(*(fetch_range(segment) for segment in state["segments"]))
+    return part
+
+
+async def fetch_into_cache(
+    client: httpx.AsyncClient,
+    url: str,
+    dataset: dict,
+    cache_dir: Path,
+    dataset_dir_name: str,
+    progress: Progress,
+    task_id: TaskID,
+    executor: concurrent.futures.ProcessPoolExecutor,
+    options: DownloadOptions,
+) -> tuple[bool, str]:
+    """Download a dataset tarball and extract it into the cache.
+
+    By default the bytes are hashed and extracted as they arrive (see
+    ``ChunkStream``); the extracted tree is only moved into the cache once
+    the MD5 checks out. With ``options.spool``, or for a file large enough to
+    be fetched in parallel segments, the tarball is completed on disk first
+    and extracted from there. Unless ``options.resume`` is off the bytes are
+    also kept in a .part file, so a failed download continues where it
+    stopped on the next run.
+    """
+    filename = dataset["filename"]
+    loop = asyncio.get_running_loop()
+    part, _ = part_paths(cache_dir, filename)
+
+    if options.segments > 1:
+        head = await client.head(url, follow_redirects=True)
+        head.raise_for_status()
+        size = int(head.headers.get("content-length", 0))
+        ranged = head.headers.get("accept-ranges") == "bytes"
+        if ranged and size >= options.segment_min_size:
+            await download_segmented(
+                client,
+                url,
+                cache_dir,
+                filename,
+                head,
+                options.segments,
+                progress,
+                task_id,
+            )
+            progress.update(task_id, description=f"[yellow]{filename} (verifying)")
+            md5 = await loop.run_in_executor(executor, file_md5, part)
+            return await extract_spooled(
+                part, md5, dataset, cache_dir, dataset_dir_name, progress, task_id, executor
+            )
+
+    if options.spool:
+        if not options.resume:
+            discard_partial(cache_dir, filename)
+        md5 = await download_sequential(
+            client, url, cache_dir, filename, None, progress, task_id, resume=True
+        )
+        return await extract_spooled(
+            part, md5, dataset, cache_dir, dataset_dir_name, progress, task_id, executor
+        )
+
+    return await stream_into_cache(
+        client,
+        url,
+        filename,
+        ("md5", dataset["md5"]),
+        dataset["md5"],
+        cache_dir,
+        dataset_dir_name,
+        progress,
+        task_id,
+        options.resume,
+    )
+
+
+async def stream_into_cache(
+    client: httpx.AsyncClient,
+    url: str,
+    filename: str,
+    expected: tuple[str, str],
+    md5: str,
+    cache_dir: Path,
+    dataset_dir_name: str,
+    progress: Progress,
+    task_id: TaskID,
+    resume: bool,
+    headers: dict[str, str] | None = None,
+) -> tuple[bool, str]:
+    """Extract a tarball while it downloads; cache it if its digest matches.
+
+    ``expected`` is the ``(algorithm, hexdigest)`` the downloaded bytes must
+    hash to, and ``md5`` the geant4-config checksum the cache entry is
+    recorded under.
+    """
+    loop = asyncio.get_running_loop()
+    tmp_extract = scratch_dir(cache_dir, dataset_dir_name)
+    try:
+        success, msg = await stream_extract(
+            client,
+            url,
+            filename,
+            expected,
+            cache_dir,
+            tmp_extract,
+            progress,
+            task_id,
+            resume,
+            headers,
+        )
+    except BaseException:
+        shutil.rmtree(tmp_extract, ignore_errors=True)
+        raise
+    if not success:
+        shutil.rmtree(tmp_extract, ignore_errors=True)
+        return False, msg
+
+    await loop.run_in_executor(
+        None, commit_to_cache, tmp_extract, cache_dir, dataset_dir_name, md5
+    )
+    return True, f"Extracted {dataset_dir_name} to cache"
+
+
+async def stream_extract(
+    client: httpx.AsyncClient,
+    url: str,
+    filename: str,
+    expected: tuple[str, str],
+    cache_dir: Path,
+    tmp_extract: Path,
+    progress: Progress,
+    task_id: TaskID,
+    resume: bool,
+    headers: dict[str, str] | None = None,
+) -> tuple[bool, str]:
+    """Download a tarball into ``tmp_extract``, extracting it as it arrives.
+
+    Fails if the bytes do not hash to ``expected``. Whatever the outcome, the
+    caller removes ``tmp_extract`` unless it commits it.
+    """
+    loop = asyncio.get_running_loop()
+    algorithm, digest = expected
+    stream = ChunkStream()
+    extraction = loop.run_in_executor(None, extract_stream, stream, tmp_extract)
+    try:
+        actual = await download_sequential(
+            client,
+            url,
+            cache_dir,
+            filename,
+            stream,
+            progress,
+            task_id,
+            resume,
+            headers,
+            algorithm,
+        )
+    except BaseException:
+        # The truncated stream makes the extraction fail; wait for it so its
+        # scratch directory can be removed before the error propagates.
+        stream.finish()
+        try:
+            await extraction
+        except Exception:
+            pass
+        raise
+    stream.finish()
+
+    progress.update(task_id, description=f"[yellow]{filename} (extracting)")
+    try:
+        await extraction
+        extract_error = None
     except Exception as e:
-        return False, f"Failed to install from cache: {e}"
+        extract_error = e
+
+    if actual != digest:
+        discard_partial(cache_dir, filename)
+        name = algorithm.upper()
+        progress.update(task_id, description=f"[red]{filename} ({name} mismatch)")
+        return False, f"{name} mismatch for {filename}"
+    if extract_error is not None:
+        progress.update(task_id, description=f"[red]{filename} (failed)")
+        return False, f"Failed to extract {filename}: {extract_error}"
+    discard_partial(cache_dir, filename)
+    return True, f"Extracted {filename}"
+
+
+async def stream_split_into_cache(
+    oci: OciSource,
+    client: httpx.AsyncClient,
+    repo: str,
+    layers: list[dict],
+    md5: str,
+    cache_dir: Path,
+    dataset_dir_name: str,
+    progress: Progress,
+    task_id: TaskID,
+    resume: bool,
+) -> tuple[bool, str]:
+    """Reassemble a split artifact in the cache from its layers.
+
+    Each layer holds part of the dataset directory, with paths relative to
+    it. Up to ``LAYER_STREAMS`` layers download at once, each extracted into
+    the same scratch directory as it arrives, and the dataset is cached once
+    all of them have checked out.
+    """
+    loop = asyncio.get_running_loop()
+    tmp_extract = scratch_dir(cache_dir, dataset_dir_name)
+    (tmp_extract / dataset_dir_name).mkdir()
+    semaphore = asyncio.Semaphore(LAYER_STREAMS)
+    progress.update(task_id, total=sum(layer["size"] for layer in layers))
+
+    async def fetch_layer(index: int, layer: dict) -> tuple[bool, str]:
+        async with semaphore:
+            filename = f"{dataset_dir_name}.part{index:03d}.tar.gz"
+            part_task = progress.add_task(f"[cyan]  {filename}", total=layer["size"])
+            algorithm, _, digest = layer["digest"].partition(":")
+            try:
+                return await oci.authorized(
+                    repo,
+                    lambda auth: stream_extract(
+                        client,
+                        oci.blob_url(repo, layer["digest"]),
+                        filename,
+                        (algorithm, digest),
+                        cache_dir,
+                        tmp_extract / dataset_dir_name,
+                        progress,
+                        part_task,
+                        resume,
+                        auth,
+                    ),
+                )
+            finally:
+                progress.remove_task(part_task)
+                progress.advance(task_id, layer["size"])
+
+    results = await asyncio.gather(
+        *[fetch_layer(index, layer) for index, layer in enumerate(layers)],
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException) or not result[0]:
+            shutil.rmtree(tmp_extract, ignore_errors=True)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+    await loop.run_in_executor(
+        None, commit_to_cache, tmp_extract, cache_dir, dataset_dir_name, md5
+    )
+    return True, f"Extracted {dataset_dir_name} to cache from {len(layers)} layers"
+
+
+async def fetch_from_registry(
+    oci: OciSource,
+    client: httpx.AsyncClient,
+    dataset: dict,
+    cache_dir: Path,
+    dataset_dir_name: str,
+    progress: Progress,
+    task_id: TaskID,
+    options: DownloadOptions,
+) -> tuple[bool, str]:
+    """Download a dataset's artifact layer from the registry into the cache.
+
+    The layer is streamed through the same extraction as a tarball from
+    ``dataset_url``, but checked against its OCI digest instead of the MD5
+    in geant4-config (the published tarball is repacked, not the original).
+    The layers of a split artifact are reassembled by
+    ``stream_split_into_cache``.
+    """
+    repo, layers, root = await oci.resolve(dataset_dir_name)
+    if root is not None:
+        return await stream_split_into_cache(
+            oci,
+            client,
+            repo,
+            layers,
+            dataset["md5"],
+            cache_dir,
+            dataset_dir_name,
+            progress,
+            task_id,
+            options.resume,
+        )
+    [layer] = layers
+    algorithm, _, digest = layer["digest"].partition(":")
+    return await oci.authorized(
+        repo,
+        lambda auth: stream_into_cache(
+            client,
+            oci.blob_url(repo, layer["digest"]),
+            f"{dataset_dir_name}.tar.gz",
+            (algorithm, digest),
+            dataset["md5"],
+            cache_dir,
+            dataset_dir_name,
+            progress,
+            task_id,
+            options.resume,
+            auth,
+        ),
+    )
+
+
+async def extract_spooled(
+    tarball_path: Path,
+    md5: str,
+    dataset: dict,
+    cache_dir: Path,
+    dataset_dir_name: str,
+    progress: Progress,
+    task_id: TaskID,
+    executor: concurrent.futures.ProcessPoolExecutor,
+) -> tuple[bool, str]:
+    """Extract a completely downloaded tarball into the cache once verified."""
+    filename = dataset["filename"]
+    loop = asyncio.get_running_loop()
+    if md5 != dataset["md5"]:
+        discard_partial(cache_dir, filename)
+        progress.update(task_id, description=f"[red]{filename} (MD5 mismatch)")
+        return False, f"MD5 mismatch for {filename}"
+
+    progress.update(task_id, description=f"[yellow]{filename} (extracting)")
+    success, msg = await loop.run_in_executor(
+        executor,
+        extract_to_cache,
+        tarball_path,
+        cache_dir,
+        dataset_dir_name,
+        dataset["md5"],
+    )
+    if success:
+        discard_partial(cache_dir, filename)
+    else:
+        progress.update(task_id, description=f"[red]{filename} (failed)")
+    return success, msg
 
 
 async def download_dataset(
@@ -196,75 +1477,85 @@ async def download_dataset(
     cache_dir: Path,
     progress: Progress,
     executor: concurrent.futures.ProcessPoolExecutor,
+    options: DownloadOptions,
+    oci: OciSource | None = None,
 ) -> tuple[bool, str]:
-    """Download, cache, and hard-link a single dataset."""
+    """Download, cache, and hard-link a single dataset.
+
+    With ``oci``, the dataset is pulled from the registry first and only
+    fetched from ``base_url`` if that fails.
+    """
     filename = dataset["filename"]
     url = f"{base_url}/{filename}"
     dest_dir = Path(dataset["path"])
     dataset_dir_name = dest_dir.name
-    md5_marker = cache_dir / f"{dataset_dir_name}.md5"
 
     task_id = progress.add_task(f"[cyan]{filename}", total=None)
     loop = asyncio.get_event_loop()
 
-    try:
-        # Check if already cached with correct md5
-        cached = (
-            (cache_dir / dataset_dir_name).exists()
-            and md5_marker.exists()
-            and md5_marker.read_text().strip() == dataset["md5"]
+    def waiting() -> None:
+        progress.update(
+            task_id, description=f"[yellow]{filename} (waiting for another installer)"
         )
 
-        if not cached:
-            # Download tarball to cache directory
-            tarball_path = cache_dir / filename
-            async with client.stream("GET", url, follow_redirects=True) as response:
-                response.raise_for_status()
-                total = int(response.headers.get("content-length", 0))
-                progress.update(task_id, total=total)
-
-                with open(tarball_path, "wb") as f:
-                    downloaded = 0
-                    async for chunk in response.aiter_bytes(chunk_size=8192):
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        progress.update(task_id, completed=downloaded)
-
-            # Verify MD5
-            progress.update(task_id, description=f"[yellow]{filename} (verifying)")
-            md5_valid = await loop.run_in_executor(
-                executor, verify_md5, tarball_path, dataset["md5"]
+    try:
+        async with dataset_lock(cache_dir, dataset_dir_name, waiting):
+            # Check if already cached with correct md5
+            clear_scratch(cache_dir, dataset_dir_name)
+            await loop.run_in_executor(
+                executor, migrate_legacy_entry, cache_dir, dataset_dir_name
             )
-            if not md5_valid:
-                tarball_path.unlink(missing_ok=True)
-                progress.update(task_id, description=f"[red]{filename} (MD5 mismatch)")
-                return False, f"MD5 mismatch for {filename}"
+            cached = is_cached(cache_dir, dataset_dir_name, dataset["md5"])
+
+            success = pulled = False
+            if not cached and oci is not None:
+                try:
+                    success, msg = await fetch_from_registry(
+                        oci,
+                        client,
+                        dataset,
+                        cache_dir,
+                        dataset_dir_name,
+                        progress,
+                        task_id,
+                        options,
+                    )
+                except httpx.HTTPStatusError as e:
+                    msg = f"HTTP {e.response.status_code}"
+                except Exception as e:
+                    msg = str(e)
+                pulled = success
+                if not success:
+                    progress.console.print(
+                        f"[yellow]{dataset['name']}: not pulled from registry "
+                        f"({msg}), falling back to {base_url}[/yellow]"
+                    )
+            if not cached and not success:
+                success, msg = await fetch_into_cache(
+                    client,
+                    url,
+                    dataset,
+                    cache_dir,
+                    dataset_dir_name,
+                    progress,
+                    task_id,
+                    executor,
+                    options,
+                )
+                if not success:
+                    return False, msg
+            else:
+                progress.update(task_id, total=1, completed=1)
 
-            # Extract to cache
-            progress.update(task_id, description=f"[yellow]{filename} (extracting)")
+            # Hard-link from cache to destination
+            progress.update(task_id, description=f"[yellow]{filename} (linking)")
             success, msg = await loop.run_in_executor(
-                executor,
-                extract_to_cache,
-                tarball_path,
-                cache_dir,
-                dataset_dir_name,
-                dataset["md5"],
+                executor, install_from_cache, cache_dir, dataset_dir_name, dest_dir
             )
-            if not success:
-                progress.update(task_id, description=f"[red]{filename} (failed)")
-                return False, msg
-        else:
-            progress.update(task_id, total=1, completed=1)
-
-        # Hard-link from cache to destination
-        progress.update(task_id, description=f"[yellow]{filename} (linking)")
-        success, msg = await loop.run_in_executor(
-            executor, install_from_cache, cache_dir, dataset_dir_name, dest_dir
-        )
 
         if success:
-            status = "[green]{} (cached + linked)" if cached else "[green]{} (installed)"
-            progress.update(task_id, description=status.format(filename))
+            how = "cached" if cached else "pulled" if pulled else "installed"
+            progress.update(task_id, description=f"[green]{filename} ({how}, {msg})")
             return True, f"Successfully installed {dataset['name']}"
         else:
             progress.update(task_id, description=f"[red]{filename} (failed)")
@@ -275,6 +1566,49 @@ async def download_dataset(
         return False, f"Failed to download {filename}: {e}"
 
 
+async def verify_datasets(
+    datasets: list[dict], cache_dir: Path, hashes: bool, repair: bool
+) -> list[dict]:
+    """Verify installed datasets in parallel; returns those that need repair."""
+    if not datasets:
+        return []
+    what = "sizes, mtimes and hashes" if hashes else "sizes and mtimes"
+    console.print(f"[cyan]Verifying {len(datasets)} datasets ({what})...[/cyan]")
+
+    loop = asyncio.get_event_loop()
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    executor,
+                    verify_install,
+                    cache_dir,
+                    Path(ds["path"]),
+                    hashes,
+                    repair,
+                )
+                for ds in datasets
+            ]
+        )
+
+    broken = []
+    for ds, problems in zip(datasets, results):
+        if not problems:
+            console.print(f"  [green]✓[/green] {ds['name']} ({ds['path']})")
+            continue
+        broken.append(ds)
+        console.print(
+            f"  [yellow]✗[/yellow] {ds['name']} ({ds['path']}): "
+            f"{len(problems)} problems"
+        )
+        for problem in problems[:VERIFY_REPORT_LIMIT]:
+            console.print(f"    {problem}")
+        if len(problems) > VERIFY_REPORT_LIMIT:
+            console.print(f"    ... and {len(problems) - VERIFY_REPORT_LIMIT} more")
+    console.print()
+    return broken
+
+
 async def download_all_datasets(
     datasets: list[dict],
     base_url: str,
@@ -282,13 +1616,24 @@ async def download_all_datasets(
     max_concurrent: int,
     dry_run: bool = False,
     force: bool = False,
+    options: DownloadOptions = DownloadOptions(),
+    verify: bool = False,
+    verify_hashes: bool = False,
+    source: str | None = None,
 ) -> None:
     """Download all datasets with limited concurrency."""
     # Filter out already installed datasets
     if force:
         datasets_to_install = datasets
     else:
-        datasets_to_install = [ds for ds in datasets if not Path(ds["path"]).exists()]
+        datasets_to_install = [
+            ds for ds in datasets if not is_installed(Path(ds["path"]), ds["md5"])
+        ]
+        if verify or verify_hashes:
+            installed = [ds for ds in datasets if ds not in datasets_to_install]
+            datasets_to_install += await verify_datasets(
+                installed, cache_dir, verify_hashes, repair=not dry_run
+            )
 
     if not datasets_to_install:
         console.print("[green]All datasets already installed[/green]")
@@ -299,18 +1644,13 @@ async def download_all_datasets(
             f"[yellow]DRY RUN: Would download {len(datasets_to_install)} datasets:[/yellow]"
         )
         for ds in datasets_to_install:
-            cached = (
-                (cache_dir / Path(ds["path"]).name).exists()
-                and (cache_dir / f"{Path(ds['path']).name}.md5").exists()
-                and (cache_dir / f"{Path(ds['path']).name}.md5")
-                .read_text()
-                .strip()
-                == ds["md5"]
-            )
+            cached = is_cached(cache_dir, Path(ds["path"]).name, ds["md5"])
             status = "[green](cached)[/green]" if cached else "[yellow](download)[/yellow]"
             console.print(
                 f"  [cyan]•[/cyan] {ds['name']} ({ds['filename']}) {status}"
             )
+            if source is not None:
+                console.print(f"    Registry: {source}, then {base_url}")
             console.print(f"    URL: {base_url}/{ds['filename']}")
             console.print(f"    Destination: {ds['path']}")
             console.print(f"    MD5: {ds['md5']}")
@@ -330,9 +1670,19 @@ async def download_all_datasets(
         console=console,
     )
 
+    # Every streamed tarball holds a thread extracting it while other threads
+    # feed it chunks; size the default pool so extractions cannot occupy all
+    # of them, even with every layer of a split artifact in flight.
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=2 * max_concurrent * LAYER_STREAMS + 4
+        )
+    )
+
     # Use process pool for extraction
     with concurrent.futures.ProcessPoolExecutor() as executor:
         async with httpx.AsyncClient(timeout=1800.0) as client:
+            oci = OciSource(client, source) if source is not None else None
             with progress:
                 # Use semaphore to limit concurrent downloads
                 semaphore = asyncio.Semaphore(max_concurrent)
@@ -340,7 +1690,14 @@ async def download_all_datasets(
                 async def bounded_download(dataset):
                     async with semaphore:
                         return await download_dataset(
-                            client, dataset, base_url, cache_dir, progress, executor
+                            client,
+                            dataset,
+                            base_url,
+                            cache_dir,
+                            progress,
+                            executor,
+                            options,
+                            oci,
                         )
 
                 results = await asyncio.gather(
@@ -394,13 +1751,104 @@ def main(
             help="Directory to cache downloaded datasets (avoids re-downloading)",
         ),
     ] = Path.home() / ".cache" / "geant4-datasets",
+    spool: Annotated[
+        bool,
+        typer.Option(
+            "--spool",
+            help="Write each tarball to the cache dir and extract it only after its "
+            "MD5 is verified, instead of extracting straight from the download",
+        ),
+    ] = False,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume/--no-resume",
+            help="Keep partial downloads in the cache dir and continue them with "
+            "HTTP Range requests on the next run",
+        ),
+    ] = True,
+    segments: Annotated[
+        int,
+        typer.Option(
+            "--segments",
+            help="Fetch large files as this many parallel byte ranges",
+            min=1,
+        ),
+    ] = 1,
+    segment_min_size: Annotated[
+        int,
+        typer.Option(
+            "--segment-min-size",
+            help="Smallest file, in MB, that --segments splits up",
+            min=1,
+        ),
+    ] = 100,
+    verify: Annotated[
+        bool,
+        typer.Option(
+            "--verify",
+            help="Check installed datasets against their install manifests and "
+            "repair only the files that differ",
+        ),
+    ] = False,
+    verify_hashes: Annotated[
+        bool,
+        typer.Option(
+            "--verify-hashes",
+            help="Like --verify, but also compare the SHA-256 of every file",
+        ),
+    ] = False,
+    source: Annotated[
+        str | None,
+        typer.Option(
+            "--source",
+            help="OCI repository prefix the datasets were published to with "
+            "publish_geant4_data.py, e.g. oci://ghcr.io/acts-project/geant4-data; "
+            "datasets that cannot be pulled from it come from dataset_url",
+        ),
+    ] = None,
+    only: Annotated[
+        str | None,
+        typer.Option(
+            "--only",
+            help="Comma-separated datasets (e.g. G4EMLOW,G4PARTICLEXS) and/or "
+            f"profiles ({', '.join(PROFILES)}) to install instead of all of them",
+        ),
+    ] = None,
+    shim: Annotated[
+        Path | None,
+        typer.Option(
+            "--shim",
+            help="Write a script here that installs more datasets on demand "
+            "with the same config, cache and source",
+        ),
+    ] = None,
 ) -> None:
     """Download Geant4 datasets in parallel.
 
     Datasets are cached in --cache-dir and hard-linked into the target
     locations. This means changing install prefixes does not require
     re-downloading, and identical datasets share storage on disk.
+
+    Each tarball is hashed and extracted as it downloads, and only lands in
+    the cache once its MD5 checks out. Interrupted downloads are kept as
+    .part files in the cache and resumed on the next run.
+
+    With --source, datasets are pulled from the OCI artifacts that
+    publish_geant4_data.py pushes, checked against their layer digests, and
+    only fetched from the geant4-config dataset_url if that fails.
+
+    --only installs a subset; --shim leaves behind a script that installs
+    the rest later, when a job turns out to need it.
+
+    Each installed dataset gets a manifest next to it listing its files;
+    a dataset counts as installed only once its manifest is written, and
+    --verify checks the files against it.
     """
+    if source is not None and not source.startswith("oci://"):
+        console.print(f"[red]Error: --source must be an oci:// URL: {source}[/red]")
+        raise typer.Exit(1)
+
     # Find geant4-config
     if config:
         config_path = config
@@ -414,6 +1862,10 @@ def main(
     # Parse datasets
     datasets = parse_datasets(config_path)
     console.print(f"[cyan]Found {len(datasets)} datasets[/cyan]")
+    if only is not None:
+        datasets = select_datasets(datasets, only)
+        names = ", ".join(ds["name"] for ds in datasets)
+        console.print(f"[cyan]Selected {len(datasets)}: {names}[/cyan]")
 
     # Get base URL
     base_url = get_dataset_url(config_path)
@@ -423,10 +1875,28 @@ def main(
     # Download datasets using cache
     asyncio.run(
         download_all_datasets(
-            datasets, base_url, cache_dir, max_concurrent, dry_run, force
+            datasets,
+            base_url,
+            cache_dir,
+            max_concurrent,
+            dry_run,
+            force,
+            DownloadOptions(
+                spool=spool,
+                resume=resume,
+                segments=segments,
+                segment_min_size=segment_min_size << 20,
+            ),
+            verify,
+            verify_hashes,
+            source,
         )
     )
 
+    if shim is not None and not dry_run:
+        write_shim(shim, config_path, cache_dir, source)
+        console.print(f"[cyan]Wrote on-demand installer {shim}[/cyan]")
+
 
 if __name__ == "__main__":
     app()
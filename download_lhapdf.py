@@ -4,14 +4,20 @@
 # dependencies = [
 #   "typer",
 #   "rich",
-#   "httpx",
+#   "httpx[http2]",
 # ]
 # ///
 
+import asyncio
+import contextlib
+import io
+import json
 import os
+import queue
+import shutil
 import tarfile
 import tempfile
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import Annotated
 
@@ -30,40 +36,327 @@ app = typer.Typer()
 console = Console()
 
 LHAPDF_BASE_URL = "http://lhapdfsets.web.cern.ch/lhapdfsets/current"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "lhapdf-sets"
 
+# Most sets are a few MB and are extracted by a thread straight from the
+# response; a set at least this big (compressed) is spooled to disk and
+# extracted in a worker process, where its decompression doesn't compete with
+# the event loop for the GIL.
+LARGE_SET_SIZE = 32 << 20
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+STREAM_QUEUE_CHUNKS = 64
 
-def download_and_extract(pdf_set: str, output_dir: Path) -> tuple[str, bool, str]:
-    """Download and extract a single PDF set."""
-    filename = f"{pdf_set}.tar.gz"
-    url = f"{LHAPDF_BASE_URL}/{filename}"
 
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over chunks fed in from another thread.
+
+    Lets ``tarfile`` extract a download as it arrives: the download coroutine
+    feeds chunks in, the extraction thread reads them out. ``feed`` blocks
+    once ``maxsize`` chunks are queued, so a slow extraction throttles the
+    download instead of buffering the whole tarball in memory.
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_CHUNKS):
+        super().__init__()
+        self._queue: queue.Queue[bytes] = queue.Queue(maxsize)
+        self._buffer = b""
+        self._eof = False
+
+    def feed(self, chunk: bytes) -> None:
+        if chunk:
+            self._queue.put(chunk)
+
+    def finish(self) -> None:
+        """Signal the end of the data (after the last chunk, or on failure)."""
+        self._queue.put(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            chunk = self._queue.get()
+            if not chunk:
+                self._eof = True
+            self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def drain(self) -> None:
+        """Consume and discard the rest, so a blocked ``feed`` can finish."""
+        while self.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+
+
+def extract_tarball(tar: tarfile.TarFile, target_dir: Path, pdf_set: str) -> None:
+    """Extract ``tar`` next to ``target_dir`` and swap its contents into place.
+
+    A set that fails halfway (e.g. the connection drops) leaves nothing
+    behind, and an older copy of the set is only replaced once the new one
+    is complete.
+    """
+    scratch = Path(tempfile.mkdtemp(prefix=f".{pdf_set}.", dir=target_dir))
     try:
-        with tempfile.NamedTemporaryFile(
-            mode="wb", delete=False, suffix=".tar.gz"
-        ) as tmp:
-            tmp_path = tmp.name
-
-            # Stream download
-            with httpx.stream(
-                "GET", url, follow_redirects=True, timeout=300.0
-            ) as response:
-                response.raise_for_status()
-                for chunk in response.iter_bytes(chunk_size=8192):
+        tar.extractall(scratch, filter="data")
+        for entry in scratch.iterdir():
+            replace_path(entry, target_dir / entry.name)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def replace_path(src: Path, target: Path) -> None:
+    """Move ``src`` to ``target``, removing whatever is there first."""
+    if target.is_dir() and not target.is_symlink():
+        shutil.rmtree(target)
+    elif target.exists() or target.is_symlink():
+        target.unlink()
+    src.rename(target)
+
+
+def extract_stream(stream: ChunkStream, target_dir: Path, pdf_set: str) -> None:
+    """Extract a set from the response as it streams in (runs in a thread)."""
+    try:
+        with tarfile.open(fileobj=stream, mode="r|gz") as tar:
+            extract_tarball(tar, target_dir, pdf_set)
+    finally:
+        stream.drain()
+
+
+def extract_file(tarball: Path, target_dir: Path, pdf_set: str) -> None:
+    """Extract a spooled set (runs in the process pool)."""
+    with tarfile.open(tarball, "r:gz") as tar:
+        extract_tarball(tar, target_dir, pdf_set)
+
+
+def load_record(cache_dir: Path, pdf_set: str, url: str) -> dict | None:
+    """The cache record of a set, if the set is cached and came from ``url``."""
+    try:
+        record = json.loads((cache_dir / f"{pdf_set}.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if record.get("url") != url or not (cache_dir / pdf_set).is_dir():
+        return None
+    return record
+
+
+def save_record(cache_dir: Path, pdf_set: str, record: dict) -> None:
+    path = cache_dir / f"{pdf_set}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(record))
+    tmp.replace(path)
+
+
+def validators(response: httpx.Response) -> dict:
+    """What identifies the version of a set the server is offering."""
+    return {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+    }
+
+
+def unchanged(record: dict, response: httpx.Response) -> bool:
+    """Whether ``response`` serves the version of the set that is cached.
+
+    Either the server confirmed it (304), or it ignored the conditional
+    request but reports the same ETag, or, lacking one, the same size and
+    modification time.
+    """
+    if response.status_code == 304:
+        return True
+    if not response.is_success:
+        return False
+    current = validators(response)
+    if current["etag"] is not None:
+        return current["etag"] == record["etag"]
+    size = response.headers.get("content-length")
+    return (
+        current["last_modified"] is not None
+        and current["last_modified"] == record["last_modified"]
+        and size is not None
+        and int(size) == record["size"]
+    )
+
+
+def transient(exc: httpx.HTTPError) -> bool:
+    """Whether a failed request is worth another try later (429, 5xx, network)."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def same_file(a: os.stat_result, b: os.stat_result) -> bool:
+    if (a.st_ino, a.st_dev) == (b.st_ino, b.st_dev):
+        return True
+    # Copies made when hard-linking fails keep size and mtime
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+def is_linked(src: Path, dest: Path) -> bool:
+    """Whether ``dest`` holds exactly the files of ``src`` (linked or copied)."""
+    if not dest.is_dir() or dest.is_symlink():
+        return False
+    for root, dirnames, filenames in os.walk(src):
+        rel = Path(root).relative_to(src)
+        try:
+            present = set(os.listdir(dest / rel))
+        except OSError:
+            return False
+        if present != set(dirnames) | set(filenames):
+            return False
+        for name in filenames:
+            try:
+                if not same_file(
+                    os.stat(Path(root) / name), os.stat(dest / rel / name)
+                ):
+                    return False
+            except OSError:
+                return False
+    return True
+
+
+def link_file(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def link_set(cache_dir: Path, output_dir: Path, pdf_set: str) -> bool:
+    """Hard-link a cached set into ``output_dir``; returns whether it changed.
+
+    Like extraction, the set is assembled next to its final place and then
+    swapped in, so it is never seen half-linked.
+    """
+    src = cache_dir / pdf_set
+    dest = output_dir / pdf_set
+    if is_linked(src, dest):
+        return False
+    scratch = Path(tempfile.mkdtemp(prefix=f".{pdf_set}.", dir=output_dir))
+    try:
+        shutil.copytree(src, scratch / pdf_set, symlinks=True, copy_function=link_file)
+        replace_path(scratch / pdf_set, dest)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return True
+
+
+async def fetch_into_cache(
+    response: httpx.Response,
+    pdf_set: str,
+    cache_dir: Path,
+    threads: ThreadPoolExecutor,
+    processes: ProcessPoolExecutor,
+) -> int:
+    """Extract the set ``response`` is serving into the cache; returns its size."""
+    loop = asyncio.get_running_loop()
+    size = int(response.headers.get("content-length", 0))
+
+    if size >= LARGE_SET_SIZE:
+        fd, tmp_name = tempfile.mkstemp(suffix=".tar.gz", dir=cache_dir)
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
                     tmp.write(chunk)
+            await loop.run_in_executor(
+                processes, extract_file, tmp_path, cache_dir, pdf_set
+            )
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return response.num_bytes_downloaded
+
+    stream = ChunkStream()
+    extraction = loop.run_in_executor(threads, extract_stream, stream, cache_dir, pdf_set)
+    try:
+        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            await loop.run_in_executor(None, stream.feed, chunk)
+    except BaseException:
+        # The truncated stream makes the extraction fail; report the
+        # download error rather than that.
+        stream.finish()
+        with contextlib.suppress(Exception):
+            await extraction
+        raise
+    stream.finish()
+    await extraction
+    return response.num_bytes_downloaded
 
-        # Extract tarball
-        with tarfile.open(tmp_path, "r:gz") as tar:
-            tar.extractall(path=output_dir)
 
-        # Clean up temp file
-        os.unlink(tmp_path)
+async def download_and_extract(
+    client: httpx.AsyncClient,
+    pdf_set: str,
+    output_dir: Path,
+    cache_dir: Path,
+    base_url: str,
+    threads: ThreadPoolExecutor,
+    processes: ProcessPoolExecutor,
+) -> tuple[str, bool, str, int]:
+    """Bring a single PDF set up to date in the cache and link it into place.
 
-        return pdf_set, True, ""
+    A cached set is revalidated with a conditional request and only
+    downloaded again if the server has a different version. If the server
+    cannot be reached or fails with a 429 or 5xx, the cached copy (still
+    intact, see ``extract_tarball``) is used as it is. Returns the set,
+    whether it succeeded, what happened (or the error) and how many bytes
+    the cache saved.
+    """
+    url = f"{base_url}/{pdf_set}.tar.gz"
+    loop = asyncio.get_running_loop()
+
+    try:
+        record = load_record(cache_dir, pdf_set, url)
+        headers = {}
+        if record is not None:
+            if record["etag"]:
+                headers["If-None-Match"] = record["etag"]
+            if record["last_modified"]:
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        stale = None
+        try:
+            async with client.stream(
+                "GET", url, headers=headers, follow_redirects=True
+            ) as response:
+                if record is not None and unchanged(record, response):
+                    saved = record["size"]
+                else:
+                    response.raise_for_status()
+                    size = await fetch_into_cache(
+                        response, pdf_set, cache_dir, threads, processes
+                    )
+                    record = {"url": url, **validators(response), "size": size}
+                    save_record(cache_dir, pdf_set, record)
+                    saved = 0
+        except httpx.HTTPError as e:
+            if record is None or not transient(e):
+                raise
+            stale = str(e) or type(e).__name__
+            if isinstance(e, httpx.HTTPStatusError):
+                stale = f"HTTP {e.response.status_code}"
+            console.print(
+                f"[yellow]{pdf_set}: could not revalidate ({stale}), "
+                f"using the cached copy[/yellow]",
+                highlight=False,
+            )
+            saved = record["size"]
+
+        changed = await loop.run_in_executor(
+            threads, link_set, cache_dir, output_dir, pdf_set
+        )
+        if stale is not None:
+            status = "cached, not revalidated"
+        elif not saved:
+            status = "downloaded"
+        elif changed:
+            status = "cached, linked"
+        else:
+            status = "up to date"
+        return pdf_set, True, status, saved
     except Exception as e:
-        # Clean up temp file on error
-        if "tmp_path" in locals() and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-        return pdf_set, False, str(e)
+        return pdf_set, False, str(e), 0
 
 
 def parse_index_file(index_path: Path) -> list[str]:
@@ -80,9 +373,76 @@ def parse_index_file(index_path: Path) -> list[str]:
     return pdf_sets
 
 
-def download_sets(pdf_sets: list[str], output_dir: Path, workers: int):
-    """Common function to download and extract PDF sets."""
+async def download_all(
+    pdf_sets: list[str],
+    output_dir: Path,
+    cache_dir: Path,
+    workers: int,
+    base_url: str,
+    http2: bool,
+    progress: Progress,
+    task: int,
+) -> tuple[list[tuple[str, str]], int, int]:
+    """Fetch all sets over one pooled client.
+
+    Returns the failures, how many sets came from the cache and how many
+    bytes that saved.
+    """
     failed = []
+    reused = saved_total = 0
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    semaphore = asyncio.Semaphore(workers)
+
+    with (
+        ThreadPoolExecutor(max_workers=workers) as threads,
+        ProcessPoolExecutor(max_workers=workers) as processes,
+    ):
+        async with httpx.AsyncClient(
+            http2=http2, limits=limits, timeout=300.0
+        ) as client:
+
+            async def bounded(pdf_set: str) -> tuple[str, bool, str, int]:
+                async with semaphore:
+                    return await download_and_extract(
+                        client,
+                        pdf_set,
+                        output_dir,
+                        cache_dir,
+                        base_url,
+                        threads,
+                        processes,
+                    )
+
+            for future in asyncio.as_completed([bounded(s) for s in pdf_sets]):
+                pdf_set, success, detail, saved = await future
+                if success:
+                    progress.console.print(f"[green]✓[/green] {pdf_set} ({detail})")
+                    if saved:
+                        reused += 1
+                        saved_total += saved
+                else:
+                    progress.console.print(f"[red]✗[/red] {pdf_set}: {detail}")
+                    failed.append((pdf_set, detail))
+                progress.advance(task)
+    return failed, reused, saved_total
+
+
+def download_sets(
+    pdf_sets: list[str],
+    output_dir: Path,
+    workers: int,
+    base_url: str = LHAPDF_BASE_URL,
+    http2: bool = False,
+    cache_dir: Path = DEFAULT_CACHE_DIR,
+):
+    """Common function to download and extract PDF sets.
+
+    Sets are extracted into ``cache_dir`` and hard-linked into
+    ``output_dir``. All sets share one keep-alive connection pool; each
+    tarball is extracted while it downloads (see ``ChunkStream``), and only
+    large ones take the detour through a temporary file and a worker process.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -91,24 +451,26 @@ def download_sets(pdf_sets: list[str], output_dir: Path, workers: int):
         console=console,
     ) as progress:
         task = progress.add_task("[cyan]Downloading PDF sets...", total=len(pdf_sets))
-
-        with ProcessPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(download_and_extract, pdf_set, output_dir): pdf_set
-                for pdf_set in pdf_sets
-            }
-
-            for future in as_completed(futures):
-                pdf_set, success, error = future.result()
-                if success:
-                    progress.console.print(f"[green]✓[/green] {pdf_set}")
-                else:
-                    progress.console.print(f"[red]✗[/red] {pdf_set}: {error}")
-                    failed.append((pdf_set, error))
-                progress.advance(task)
+        failed, reused, saved = asyncio.run(
+            download_all(
+                pdf_sets,
+                output_dir,
+                cache_dir,
+                workers,
+                base_url,
+                http2,
+                progress,
+                task,
+            )
+        )
 
     # Summary
     console.print()
+    if reused:
+        console.print(
+            f"[cyan]{reused} sets unchanged since cached in {cache_dir}, "
+            f"{saved / 1e6:.1f} MB not downloaded[/cyan]"
+        )
     if failed:
         console.print(f"[yellow]Completed with {len(failed)} failures:[/yellow]")
         for pdf_set, error in failed:
@@ -136,8 +498,30 @@ def main(
         int, typer.Option("--job", "-j", help="Number of parallel workers")
     ] = os.cpu_count()
     or 4,
+    base_url: Annotated[
+        str, typer.Option(help="Where the PDF set tarballs are served from")
+    ] = LHAPDF_BASE_URL,
+    http2: Annotated[
+        bool,
+        typer.Option(
+            "--http2",
+            help="Negotiate HTTP/2 with the server (only possible over https)",
+        ),
+    ] = False,
+    cache_dir: Annotated[
+        Path,
+        typer.Option(
+            help="Directory to cache extracted sets in; unchanged sets are "
+            "hard-linked from here instead of downloaded again",
+        ),
+    ] = DEFAULT_CACHE_DIR,
 ):
-    """Download and extract LHAPDF PDF sets in parallel."""
+    """Download and extract LHAPDF PDF sets in parallel.
+
+    Each set is cached together with the ETag, Last-Modified and size the
+    server reported for it. On later runs the set is revalidated with a
+    conditional request and only downloaded again if it changed.
+    """
 
     # Validate mutually exclusive options
     if index_file is None and pdf_sets is None:
@@ -166,7 +550,7 @@ def main(
     else:
         raise ValueError("Unreachable code")
 
-    download_sets(sets, output_dir, workers)
+    download_sets(sets, output_dir, workers, base_url, http2, cache_dir)
 
 
 if __name__ == "__main__":
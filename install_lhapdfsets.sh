@@ -1,6 +1,9 @@
 #!/bin/bash
+set -euo pipefail
 SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}"   )" &> /dev/null && pwd   )
 
 target_dir="$(spack location -i lhapdfsets)"
 
-uv run "$SCRIPT_DIR"/download_lhapdf.py "MMHT2014lo68cl,MMHT2014nlo68cl,CT14lo,CT14nlo,NNPDF23_nlo_as_0119_qed" "$target_dir"
+# Sets are cached (by default in ~/.cache/lhapdf-sets) and revalidated against
+# the server, so re-running this only re-links unchanged sets.
+uv run "$SCRIPT_DIR"/download_lhapdf.py "MMHT2014lo68cl,MMHT2014nlo68cl,CT14lo,CT14nlo,NNPDF23_nlo_as_0119_qed" --output-dir "$target_dir" "$@"
@@ -4,15 +4,29 @@
 # dependencies = [
 #   "typer",
 #   "rich",
+#   "httpx",
 # ]
 # ///
 
 import typer
 from typing import Annotated
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urljoin
+import base64
+import hashlib
+import os
 import subprocess
 import json
 import re
+import time
+import httpx
 from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+console = Console()
 
 
 def get_release_assets(version: str):
@@ -30,38 +44,258 @@ def get_release_assets(version: str):
 # yields the arch-independent tag the per-arch images are merged into.
 ARCH_RE = re.compile(r"-(?:x86_64|aarch64)")
 
+OCI_INDEX = "application/vnd.oci.image.index.v1+json"
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+DOCKER_MANIFEST_LIST = "application/vnd.docker.distribution.manifest.list.v2+json"
+DOCKER_MANIFEST = "application/vnd.docker.distribution.manifest.v2+json"
+INDEX_TYPES = {OCI_INDEX, DOCKER_MANIFEST_LIST}
+MANIFEST_ACCEPT = ", ".join(
+    [OCI_INDEX, OCI_MANIFEST, DOCKER_MANIFEST_LIST, DOCKER_MANIFEST]
+)
+
+# Registry hiccups worth another attempt: connection trouble and these
+# statuses. Anything else (a missing image, bad credentials) fails the same
+# way again.
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+ATTEMPTS = 4
+# Seconds before the first retry, doubled for each one after
+BACKOFF = 2.0
+
+
+@dataclass
+class Target:
+    output: str
+    inputs: list[str]
+    output_log: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+    attempts: int = 0
+
+
+# split_ref, docker_credentials and Registry are a deliberate copy of the
+# client in publish_geant4_data.py, trimmed to what merging needs. Each script
+# runs standalone under `uv run`, so they share no module; keep fixes to the
+# copies in step.
+def split_ref(ref: str) -> tuple[str, str, str]:
+    """``ghcr.io/org/repo:tag`` -> (``ghcr.io``, ``org/repo``, ``tag``)."""
+    host, _, rest = ref.partition("/")
+    repo, _, tag = rest.rpartition(":")
+    return host, repo, tag
+
+
+def docker_credentials(host: str) -> tuple[str, str] | None:
+    """Credentials for ``host`` as stored by ``docker login``.
+
+    As with docker, a credential helper set for the host (``credHelpers``)
+    or for all hosts (``credsStore``) is asked first, and the config's own
+    ``auths`` entry is the fallback.
+    """
+    config_dir = Path(os.environ.get("DOCKER_CONFIG", Path.home() / ".docker"))
+    try:
+        config = json.loads((config_dir / "config.json").read_text())
+    except (OSError, ValueError):
+        return None
+    helper = config.get("credHelpers", {}).get(host) or config.get("credsStore")
+    if helper:
+        try:
+            res = subprocess.run(
+                [f"docker-credential-{helper}", "get"],
+                input=host,
+                capture_output=True,
+                encoding="utf-8",
+                check=True,
+            )
+            stored = json.loads(res.stdout)
+            return stored["Username"], stored["Secret"]
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+            pass
+    try:
+        auth = config["auths"][host]["auth"]
+    except (KeyError, TypeError):
+        return None
+    username, _, password = base64.b64decode(auth).decode().partition(":")
+    return username, password
+
+
+class Registry:
+    """Just enough of the OCI distribution API to merge manifests.
+
+    Authentication follows the registry's challenge: bearer tokens are
+    requested per repository (with the stored credentials, if any) and
+    reused by every request after that, until a 401 shows the token has
+    expired and a new one is requested. One client is shared by all
+    targets, so its connections are too.
+    """
+
+    def __init__(self, client: httpx.Client, host: str) -> None:
+        # Like docker, talk plain HTTP only to a registry on this machine
+        plain = host.split(":")[0] in ("localhost", "127.0.0.1")
+        self.client = client
+        self.base_url = f"{'http' if plain else 'https'}://{host}"
+        self.credentials = docker_credentials(host)
+        self.auth: dict[str, str] = {}
+
+    def authenticate(self, repo: str, challenge: str):
+        scheme, _, params = challenge.partition(" ")
+        if scheme.lower() == "basic" and self.credentials is not None:
+            token = base64.b64encode(":".join(self.credentials).encode()).decode()
+            self.auth[repo] = f"Basic {token}"
+            return
+        if scheme.lower() != "bearer":
+            raise RuntimeError(f"cannot authenticate to {self.base_url}: {challenge}")
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        # Without credentials only pulls (e.g. a dry run) can work
+        actions = "pull,push" if self.credentials is not None else "pull"
+        response = self.client.get(
+            fields["realm"],
+            params={
+                "service": fields.get("service", ""),
+                "scope": f"repository:{repo}:{actions}",
+            },
+            auth=self.credentials,
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.auth[repo] = f"Bearer {body.get('token') or body['access_token']}"
+
+    def request(self, method: str, repo: str, path: str, **kwargs) -> httpx.Response:
+        url = urljoin(f"{self.base_url}/v2/{repo}/", path)
+        headers = kwargs.pop("headers", {})
+        for attempt in range(2):
+            sent = self.auth.get(repo)
+            if sent is not None:
+                headers["Authorization"] = sent
+            response = self.client.request(
+                method, url, headers=headers, follow_redirects=True, **kwargs
+            )
+            if response.status_code != 401 or attempt:
+                break
+            # No token yet, or it expired mid-run. Another target may have
+            # replaced it in the meantime; otherwise answer the new challenge.
+            if self.auth.get(repo) == sent:
+                self.auth.pop(repo, None)
+                self.authenticate(repo, response.headers.get("www-authenticate", ""))
+        response.raise_for_status()
+        return response
+
+    def get_manifest(self, repo: str, reference: str) -> tuple[str, str, bytes]:
+        """Media type, digest and raw bytes of a manifest or index."""
+        response = self.request(
+            "GET", repo, f"manifests/{reference}", headers={"Accept": MANIFEST_ACCEPT}
+        )
+        media_type = response.headers.get("content-type", "").split(";")[0]
+        body = response.content
+        return media_type, f"sha256:{hashlib.sha256(body).hexdigest()}", body
+
+    def get_blob(self, repo: str, digest: str) -> bytes:
+        return self.request("GET", repo, f"blobs/{digest}").content
+
+    def put_manifest(self, repo: str, tag: str, media_type: str, body: bytes):
+        self.request(
+            "PUT",
+            repo,
+            f"manifests/{tag}",
+            content=body,
+            headers={"Content-Type": media_type},
+        )
+
+
+def transient(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in TRANSIENT_STATUS
+    return isinstance(exc, httpx.TransportError)
 
-def inspect(manifest: str):
-    subprocess.run(["docker", "buildx", "imagetools", "inspect", manifest], check=True)
 
+def describe(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code}"
+    return escape(str(exc) or type(exc).__name__)
 
-def create_manifest(target: str, inputs: list[str], do_push: bool):
-    # `docker manifest create` refuses inputs that are themselves manifest lists,
-    # which is what buildx pushes since the builds gained provenance attestations
-    # (an OCI index holding the image plus its attestation manifest). `buildx
-    # imagetools create` merges those, keeping the attestations intact. It writes
-    # straight to the registry, so --dry-run stands in for "don't push".
-    cmd = ["docker", "buildx", "imagetools", "create", "--tag", target]
+
+def run(target: Target, step: str, action):
+    # Runs concurrently with the other targets, so the output is collected and
+    # printed per target once it is done rather than interleaved.
+    start = time.monotonic()
+    for attempt in range(1, ATTEMPTS + 1):
+        target.attempts += 1
+        try:
+            result = action()
+            break
+        except httpx.HTTPError as exc:
+            if attempt == ATTEMPTS or not transient(exc):
+                raise
+            delay = BACKOFF * 2 ** (attempt - 1)
+            console.print(
+                f"[yellow]{target.output}: {step} failed ({describe(exc)}), "
+                f"retrying in {delay:.0f}s[/yellow]",
+                highlight=False,
+            )
+            time.sleep(delay)
+    target.timings[step] = time.monotonic() - start
+    return result
+
+
+def descriptors(registry: Registry, ref: str) -> list[dict]:
+    _, repo, tag = split_ref(ref)
+    media_type, digest, body = registry.get_manifest(repo, tag)
+    manifest = json.loads(body)
+    if media_type in INDEX_TYPES:
+        # buildx pushes an index holding the image plus its provenance
+        # attestation manifest; take over all of its entries, attestations
+        # included, like `imagetools create` did.
+        return manifest["manifests"]
+    # A plain image manifest: its platform is recorded in the image config
+    config = json.loads(registry.get_blob(repo, manifest["config"]["digest"]))
+    platform = {"architecture": config["architecture"], "os": config["os"]}
+    if "variant" in config:
+        platform["variant"] = config["variant"]
+    return [
+        {
+            "mediaType": media_type,
+            "digest": digest,
+            "size": len(body),
+            "platform": platform,
+        }
+    ]
+
+
+def create_manifest(target: Target, registry: Registry, do_push: bool):
+    # The index is assembled from the per-arch manifests' descriptors and PUT
+    # straight to the registry. The inputs live in the same repository as the
+    # output, so everything the index references is already there.
+    manifests = run(
+        target,
+        "resolve",
+        lambda: [d for ref in target.inputs for d in descriptors(registry, ref)],
+    )
+    index = {"schemaVersion": 2, "mediaType": OCI_INDEX, "manifests": manifests}
+    body = json.dumps(index, indent=2).encode()
     if not do_push:
-        cmd.append("--dry-run")
-    cmd += inputs
-    subprocess.run(cmd, check=True)
+        # What would be pushed, as `imagetools create --dry-run` printed it
+        target.output_log.append(body.decode())
+        return None
+    _, repo, tag = split_ref(target.output)
+    run(target, "create", lambda: registry.put_manifest(repo, tag, OCI_INDEX, body))
+    return f"sha256:{hashlib.sha256(body).hexdigest()}"
 
 
-def main(
-    version: str,
-    pattern: str,
-    registry: str = "ghcr.io/acts-project/spack-container",
-    do_push: Annotated[bool, typer.Option("--push/--no-push")] = False,
-):
-    console = Console()
+def inspect(target: Target, registry: Registry, digest: str):
+    _, repo, tag = split_ref(target.output)
+    _, actual, _ = run(target, "verify", lambda: registry.get_manifest(repo, tag))
+    if actual != digest:
+        raise RuntimeError(f"{target.output} resolves to {actual}, pushed {digest}")
+    target.output_log.append(f"{target.output} -> {digest}")
 
-    if version.startswith("v"):
-        version = version[1:]
 
-    assets = get_release_assets(version)
-    dockerfiles = [a["name"] for a in assets if a["name"].startswith("Dockerfile.")]
+def merge(target: Target, registry: Registry, do_push: bool):
+    digest = create_manifest(target, registry, do_push)
+    # A dry run leaves nothing in the registry to look at
+    if do_push:
+        inspect(target, registry, digest)
 
+
+def plan_target(
+    pattern: str, dockerfiles: list[str], registry: str, version: str
+) -> Target:
     ex = re.compile(pattern)
     # fullmatch, so a pattern ending in `cxx20` does not also pull in the
     # flavored `cxx20_cuda13` / `cxx20_rocm7` builds. Those are published
@@ -71,7 +305,7 @@ def main(
     matching = sorted(m.replace("@", "-").replace("Dockerfile.", "") for m in matching)
 
     if len(matching) == 0:
-        raise ValueError("No manifests matched the pattern given")
+        raise ValueError(f"No manifests matched the pattern {pattern!r}")
 
     # Everything that is merged must be the same build for different
     # architectures. Anything else is a too-broad pattern, and silently produces
@@ -83,19 +317,98 @@ def main(
             + ", ".join(sorted(output_triplets))
         )
 
-    output_manifest = f"{registry}:{version}_{output_triplets.pop()}"
-    manifests = [f"{registry}:{version}_{m}" for m in matching]
-
-    console.print(
-        f"Will combine the following [bold green]{len(manifests)} manifests [/bold green]",
-        highlight=False,
+    return Target(
+        output=f"{registry}:{version}_{output_triplets.pop()}",
+        inputs=[f"{registry}:{version}_{m}" for m in matching],
     )
-    for manifest in manifests:
-        console.print(f" - [b]{manifest}[/b]", highlight=False)
 
-    console.print(f"~> into [b green]{output_manifest}[/b green]", highlight=False)
 
-    create_manifest(output_manifest, manifests, do_push)
+def main(
+    version: str,
+    patterns: Annotated[
+        list[str],
+        typer.Argument(help="Dockerfile patterns, one per target manifest"),
+    ],
+    registry: str = "ghcr.io/acts-project/spack-container",
+    do_push: Annotated[bool, typer.Option("--push/--no-push")] = False,
+    jobs: Annotated[
+        int,
+        typer.Option("--jobs", "-j", help="Target manifests merged at once", min=1),
+    ] = 4,
+):
+    if version.startswith("v"):
+        version = version[1:]
+
+    assets = get_release_assets(version)
+    dockerfiles = [a["name"] for a in assets if a["name"].startswith("Dockerfile.")]
+
+    # Plan every target before touching the registry, so a bad pattern fails
+    # the job before anything is pushed
+    targets = [plan_target(p, dockerfiles, registry, version) for p in patterns]
+    outputs = [t.output for t in targets]
+    duplicates = sorted({o for o in outputs if outputs.count(o) > 1})
+    if duplicates:
+        raise ValueError("Several patterns merge into " + ", ".join(duplicates))
+
+    for target in targets:
+        console.print(
+            f"Will combine the following [bold green]{len(target.inputs)} manifests [/bold green]",
+            highlight=False,
+        )
+        for manifest in target.inputs:
+            console.print(f" - [b]{manifest}[/b]", highlight=False)
+
+        console.print(f"~> into [b green]{target.output}[/b green]", highlight=False)
+
+    failed: list[Target] = []
+    with (
+        httpx.Client(timeout=60.0) as client,
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+    ):
+        registry_client = Registry(client, registry.partition("/")[0])
+        if do_push and registry_client.credentials is None:
+            # Anonymous tokens only allow pulls; say so now rather than let
+            # every target fail with a bare 401/403
+            console.print(
+                f"[red]No credentials for {registry.partition('/')[0]}: log in "
+                f"with `docker login` first[/red]"
+            )
+            raise typer.Exit(1)
+        futures = {
+            executor.submit(merge, t, registry_client, do_push): t for t in targets
+        }
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                future.result()
+                console.print(f"[green]✓ {target.output}[/green]", highlight=False)
+            except Exception as exc:  # noqa: BLE001
+                console.print(
+                    f"[red]✗ {target.output}: {describe(exc)}[/red]",
+                    highlight=False,
+                )
+                failed.append(target)
+            for output in target.output_log:
+                if output.strip():
+                    console.print(output.rstrip(), highlight=False, markup=False)
+
+    table = Table(
+        "Tag", "Resolve", "Create", "Verify", "Attempts", "Status", title=registry
+    )
+    for target in targets:
+        table.add_row(
+            target.output.removeprefix(f"{registry}:"),
+            *(
+                f"{target.timings[step]:.1f}s" if step in target.timings else "-"
+                for step in ("resolve", "create", "verify")
+            ),
+            str(target.attempts),
+            "[red]failed[/red]" if target in failed else "[green]ok[/green]",
+        )
+    console.print(table)
+
+    if failed:
+        raise typer.Exit(1)
 
     console.print("[bold green]DONE![/bold green]")
 
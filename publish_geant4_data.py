@@ -3,21 +3,28 @@
 # requires-python = ">=3.11"
 # dependencies = [
 #   "typer",
+#   "httpx",
 #   "rich",
+#   "zstandard",
 # ]
 # ///
-"""Ensure the Geant4 data sets a given Geant4 requests are available in GHCR.
+"""Ensure the Geant4 data sets given Geant4 releases request are available in GHCR.
 
 The set of data sets is read from a ``geant4-config`` script (its ``dataset_list``
 is baked from Geant4's upstream ``G4DatasetDefinitions.cmake`` and is therefore
-canonical for a given Geant4 version). For each requested data set we:
+canonical for a given Geant4 version). Several releases can be handled in one
+run; they mostly share data set versions, so the union of their lists is taken
+and each distinct data set is handled once. For each requested data set we:
 
   * compute its OCI reference ``<repo-prefix>/<name-lower>:<version>``
     (e.g. ``.../geant4-data/g4ndl:4.7.1``),
   * skip it if that tag already exists in the registry (immutable version key),
   * otherwise pack the versioned directory from the source tree (e.g. CVMFS
     ``/cvmfs/geant4.cern.ch/share/data/G4NDL4.7.1``) into a single deterministic
-    tarball and push it as an ORAS artifact.
+    tarball, compressed on all cores, and stream it into the registry as an
+    ORAS-style artifact (no temporary files). With ``--split-size`` the
+    directory is packed into several smaller tarballs instead, one layer each,
+    which consumers can pull in parallel.
 
 GHCR stores blobs content-addressed by digest, so a data set version is uploaded
 exactly once even if several Geant4 releases share it, and re-runs upload nothing
@@ -27,18 +34,29 @@ needs no MD5 verification.
 Only the exact data sets ``geant4-config`` lists are published -- nothing else in
 the source tree is mirrored.
 
-Requires ``oras`` on PATH, already authenticated against the target registry.
+Talks to the registry directly, with the credentials that ``oras login`` (or
+``docker login``) stored for it, including through a credential helper.
 """
 
+import base64
+import hashlib
+import io
+import json
+import os
 import re
-import shutil
+import struct
 import subprocess
-import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import lru_cache
+import tarfile
+import time
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, BinaryIO
+from urllib.parse import urljoin
 
+import httpx
 import typer
 from rich.console import Console
 
@@ -51,6 +69,54 @@ DEFAULT_REPO_PREFIX = "ghcr.io/acts-project/geant4-data"
 
 ARTIFACT_TYPE = "application/vnd.acts.geant4-data.dataset.v1"
 LAYER_MEDIA_TYPE = "application/vnd.acts.geant4-dataset.tar+gzip"
+LAYER_MEDIA_TYPE_ZSTD = "application/vnd.acts.geant4-dataset.tar+zstd"
+# Layer media type and tarball suffix per --compression choice
+COMPRESSIONS = {
+    "gzip": (LAYER_MEDIA_TYPE, ".tar.gz"),
+    "zstd": (LAYER_MEDIA_TYPE_ZSTD, ".tar.zst"),
+}
+
+# The tar stream is cut into blocks of this size that are compressed
+# independently, one per thread; 1 MiB keeps the ratio within a fraction of a
+# percent of a single stream. Level 6 is what gzip -n used by default.
+COMPRESS_BLOCK_SIZE = 1 << 20
+COMPRESS_THREADS = os.cpu_count() or 1
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+# ID, CM=deflate, FLG=0, MTIME=0, XFL=0, OS=255 (unknown)
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+# Artifacts carry the empty JSON object as config, as oras push does
+EMPTY_CONFIG = b"{}"
+EMPTY_CONFIG_MEDIA_TYPE = "application/vnd.oci.empty.v1+json"
+# Layers are uploaded in PATCH requests of this size as they are compressed
+UPLOAD_CHUNK_SIZE = 16 << 20
+# A split artifact carries this manifest annotation, naming the directory all
+# of its layers are extracted into; their paths are relative to it
+SPLIT_ROOT_ANNOTATION = "org.acts-project.geant4-data.root"
+# Split parts end after a file whose path (relative to the dataset root)
+# hashes to 0 modulo this, once they hold half the split size; boundaries so
+# follow file names, and parts of files unchanged between dataset versions
+# come out identical and are stored once. Parts end regardless at twice the
+# split size.
+SPLIT_ANCHOR_MODULUS = 8
+
+# Manifest kinds a tag lookup accepts, and how many lookups run at once
+MANIFEST_ACCEPT = ", ".join(
+    [
+        OCI_MANIFEST,
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    ]
+)
+LOOKUP_THREADS = 16
+# A lookup that fails with one of these (or a connection error) is retried,
+# waiting LOOKUP_BACKOFF seconds, doubled after each attempt; anything else but
+# 404 means the registry cannot tell whether the tag exists.
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+LOOKUP_ATTEMPTS = 4
+LOOKUP_BACKOFF = 2.0
 
 # ``G4NDL4.7.1`` -> name=``G4NDL`` version=``4.7.1``. The version is the trailing
 # run of dot-separated integers; the name is everything before it (lazy match).
@@ -150,54 +216,412 @@ def find_geant4_config(cvmfs_root: Path, version: str) -> Path:
     raise typer.Exit(1)
 
 
-@lru_cache(maxsize=1)
-def _tar_is_gnu() -> bool:
-    """Return True if the ``tar`` on PATH is GNU tar (needed for reproducibility)."""
-    try:
-        out = subprocess.run(
-            ["tar", "--version"], capture_output=True, text=True, check=True
+def release_version(name: str) -> tuple[int, int, int] | None:
+    """Parse a spack semver or CVMFS release name as ``(major, minor, patch)``.
+
+    Accepts ``11.4.1`` as well as the CVMFS spellings ``11.4`` and ``11.4.p01``.
+    """
+    match = re.match(r"^(\d+)\.(\d+)(?:\.p?(\d+))?$", name)
+    if not match:
+        return None
+    major, minor, patch = match.groups()
+    return int(major), int(minor), int(patch or 0)
+
+
+def expand_versions(cvmfs_root: Path, specs: list[str]) -> list[str]:
+    """Expand ``--geant4-version`` values into a list of spack semvers.
+
+    A value ``A..B`` stands for every release under ``<cvmfs-root>/geant4``
+    from ``A`` to ``B`` inclusive; anything else is taken as is.
+    """
+    geant4_dir = cvmfs_root / "geant4"
+    versions: list[str] = []
+    for spec in specs:
+        low, sep, high = spec.partition("..")
+        if not sep:
+            versions.append(spec)
+            continue
+        lower, upper = release_version(low), release_version(high)
+        if lower is None or upper is None:
+            console.print(f"[red]Error: cannot parse version range {spec!r}[/red]")
+            raise typer.Exit(1)
+        available = (
+            {release_version(p.name) for p in geant4_dir.iterdir()}
+            if geant4_dir.is_dir()
+            else set()
         )
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
-    return "GNU tar" in out.stdout
+        matched = sorted(v for v in available - {None} if lower <= v <= upper)
+        if not matched:
+            console.print(
+                f"[red]Error: no geant4 release in {spec} under {geant4_dir}[/red]"
+            )
+            raise typer.Exit(1)
+        versions.extend(".".join(map(str, v)) for v in matched)
+    # Preserve order, drop duplicates.
+    return list(dict.fromkeys(versions))
+
+
+def gzip_member(block: bytes) -> bytes:
+    """Compress ``block`` into a complete gzip member.
+
+    The header is fixed (no name, mtime 0, OS "unknown") rather than left to
+    zlib, which stamps the build platform into it.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(block) + compressor.flush()
+    trailer = struct.pack("<II", zlib.crc32(block), len(block) & 0xFFFFFFFF)
+    return GZIP_HEADER + body + trailer
+
+
+def zstd_frame(block: bytes) -> bytes:
+    """Compress ``block`` into a complete zstd frame."""
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(block)
 
 
-def make_tarball(parent: Path, dirname: str, out_path: Path) -> None:
-    """Pack ``parent/dirname`` into ``out_path`` as a .tar.gz.
+class BlockCompressor(io.RawIOBase):
+    """Writable stream that compresses fixed-size blocks on a thread pool.
 
-    On GNU tar the archive is reproducible (sorted entries, zeroed mtime/owner,
-    gzip without header timestamp) so re-packing an unchanged dataset yields the
-    same digest. Elsewhere (e.g. macOS bsdtar during local testing) we fall back
-    to a plain, non-reproducible archive that is still valid.
+    Each ``COMPRESS_BLOCK_SIZE`` slice of the input becomes an independent
+    gzip member or zstd frame, written out in order; decoders read the
+    concatenation as one stream (like the output of ``pigz --independent``).
+    Block boundaries depend only on the input, so the output does too. At
+    most ``max_pending`` blocks are in flight, which bounds memory use.
     """
-    if _tar_is_gnu():
-        cmd = [
-            "tar",
-            "--sort=name",
-            "--mtime=@0",
-            "--owner=0",
-            "--group=0",
-            "--numeric-owner",
-            "--use-compress-program=gzip -n",
-            "-C",
-            str(parent),
-            "-cf",
-            str(out_path),
-            dirname,
-        ]
+
+    def __init__(
+        self,
+        out: BinaryIO,
+        compress: Callable[[bytes], bytes],
+        pool: ThreadPoolExecutor,
+        max_pending: int,
+    ) -> None:
+        super().__init__()
+        self._out = out
+        self._compress = compress
+        self._pool = pool
+        self._max_pending = max_pending
+        self._buffer = bytearray()
+        self._pending: deque[Future[bytes]] = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buffer += b
+        while len(self._buffer) >= COMPRESS_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:COMPRESS_BLOCK_SIZE]))
+            del self._buffer[:COMPRESS_BLOCK_SIZE]
+        return len(b)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._pool.submit(self._compress, block))
+        while len(self._pending) > self._max_pending:
+            self._out.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._out.write(self._pending.popleft().result())
+        super().close()
+
+
+def tree_entries(path: Path, arcname: str) -> Iterator[tuple[Path, str]]:
+    """Yield ``path`` and everything below it, siblings sorted by name."""
+    yield path, arcname
+    if path.is_dir() and not path.is_symlink():
+        for child in sorted(os.listdir(path)):
+            yield from tree_entries(path / child, f"{arcname}/{child}")
+
+
+def normalized(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    """Strip everything from a tar header that differs between hosts."""
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    if info.issym():
+        info.mode = 0o777
+    elif info.isdir() or info.mode & 0o111:
+        info.mode = 0o755
     else:
-        cmd = ["tar", "-C", str(parent), "-czf", str(out_path), dirname]
-    subprocess.run(cmd, check=True)
+        info.mode = 0o644
+    return info
 
 
-def tag_exists(ref: str) -> bool:
-    """Return True if the manifest for ``ref`` already exists in the registry."""
-    result = subprocess.run(
-        ["oras", "manifest", "fetch", "--descriptor", ref],
-        capture_output=True,
-        text=True,
-    )
-    return result.returncode == 0
+def split_entries(root: Path, split_size: int) -> list[list[tuple[Path, str]]]:
+    """Group the entries below ``root`` into parts of about ``split_size`` bytes.
+
+    Arcnames are relative to ``root``. See ``SPLIT_ANCHOR_MODULUS`` for where
+    parts end; a file larger than a part gets one to itself.
+    """
+    parts: list[list[tuple[Path, str]]] = [[]]
+    size = 0
+    for child in sorted(os.listdir(root)):
+        for path, arcname in tree_entries(root / child, child):
+            parts[-1].append((path, arcname))
+            if path.is_file() and not path.is_symlink():
+                size += path.stat().st_size
+            anchor = zlib.crc32(arcname.encode()) % SPLIT_ANCHOR_MODULUS == 0
+            if size >= 2 * split_size or (size >= split_size // 2 and anchor):
+                parts.append([])
+                size = 0
+    return [part for part in parts if part]
+
+
+def make_tarball(
+    entries: Iterable[tuple[Path, str]],
+    out: BinaryIO,
+    compression: str,
+    pool: ThreadPoolExecutor,
+) -> None:
+    """Pack ``entries`` (path, arcname) as a compressed tarball, written to ``out``.
+
+    The archive is reproducible: entries are sorted by name, and owners,
+    mtimes and permissions beyond the executable bit are normalized, so
+    re-packing an unchanged dataset yields the same digest on any host with
+    the same compression library. The tar stream is compressed in parallel
+    by ``BlockCompressor``.
+    """
+    compress = gzip_member if compression == "gzip" else zstd_frame
+    with (
+        BlockCompressor(out, compress, pool, 2 * COMPRESS_THREADS) as sink,
+        tarfile.open(fileobj=sink, mode="w|", format=tarfile.GNU_FORMAT) as tar,
+    ):
+        for path, arcname in entries:
+            info = normalized(tar.gettarinfo(path, arcname))
+            if info.isreg():
+                with open(path, "rb") as data:
+                    tar.addfile(info, data)
+            else:
+                tar.addfile(info)
+
+
+# split_ref, docker_credentials and Registry are copied, trimmed, into
+# merge_images.py, and download_geant4_datasets.py's OciSource is an async,
+# pull-only variant. Each script runs standalone under `uv run`, so they share
+# no module; keep fixes to the copies in step.
+def split_ref(ref: str) -> tuple[str, str, str]:
+    """``ghcr.io/org/repo:tag`` -> (``ghcr.io``, ``org/repo``, ``tag``)."""
+    host, _, rest = ref.partition("/")
+    repo, _, tag = rest.rpartition(":")
+    return host, repo, tag
+
+
+def docker_credentials(host: str) -> tuple[str, str] | None:
+    """Credentials for ``host`` as stored by ``oras login`` or ``docker login``.
+
+    As with docker, a credential helper set for the host (``credHelpers``)
+    or for all hosts (``credsStore``) is asked first, and the config's own
+    ``auths`` entry is the fallback.
+    """
+    config_dir = Path(os.environ.get("DOCKER_CONFIG", Path.home() / ".docker"))
+    try:
+        config = json.loads((config_dir / "config.json").read_text())
+    except (OSError, ValueError):
+        return None
+    helper = config.get("credHelpers", {}).get(host) or config.get("credsStore")
+    if helper:
+        try:
+            res = subprocess.run(
+                [f"docker-credential-{helper}", "get"],
+                input=host,
+                capture_output=True,
+                encoding="utf-8",
+                check=True,
+            )
+            stored = json.loads(res.stdout)
+            return stored["Username"], stored["Secret"]
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+            pass
+    try:
+        auth = config["auths"][host]["auth"]
+    except (KeyError, TypeError):
+        return None
+    username, _, password = base64.b64decode(auth).decode().partition(":")
+    return username, password
+
+
+class Registry:
+    """Just enough of the OCI distribution API to push dataset artifacts.
+
+    Authentication follows the registry's challenge: bearer tokens are
+    requested per repository (with the stored credentials, if any) and
+    reused by every request after that, until a 401 shows the token has
+    expired and a new one is requested.
+    """
+
+    def __init__(self, client: httpx.Client, host: str) -> None:
+        # Like oras and docker, talk plain HTTP only to a registry on this machine
+        plain = host.split(":")[0] in ("localhost", "127.0.0.1")
+        self.client = client
+        self.base_url = f"{'http' if plain else 'https'}://{host}"
+        self.credentials = docker_credentials(host)
+        self.auth: dict[str, str] = {}
+
+    def authenticate(self, repo: str, challenge: str) -> None:
+        scheme, _, params = challenge.partition(" ")
+        if scheme.lower() == "basic" and self.credentials is not None:
+            token = base64.b64encode(":".join(self.credentials).encode()).decode()
+            self.auth[repo] = f"Basic {token}"
+            return
+        if scheme.lower() != "bearer":
+            raise RuntimeError(f"cannot authenticate to {self.base_url}: {challenge}")
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        # Without credentials only pulls (e.g. a dry run's lookups) can work
+        actions = "pull,push" if self.credentials is not None else "pull"
+        response = self.client.get(
+            fields["realm"],
+            params={
+                "service": fields.get("service", ""),
+                "scope": f"repository:{repo}:{actions}",
+            },
+            auth=self.credentials,
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.auth[repo] = f"Bearer {body.get('token') or body['access_token']}"
+
+    def request(
+        self, method: str, repo: str, path: str, **kwargs
+    ) -> httpx.Response:
+        """Send a request for ``/v2/<repo>/<path>`` (or an absolute URL)."""
+        url = urljoin(f"{self.base_url}/v2/{repo}/", path)
+        headers = kwargs.pop("headers", {})
+        for attempt in range(2):
+            sent = self.auth.get(repo)
+            if sent is not None:
+                headers["Authorization"] = sent
+            response = self.client.request(method, url, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            # No token yet, or it expired mid-push. Another thread may have
+            # replaced it in the meantime; otherwise answer the new challenge.
+            if self.auth.get(repo) == sent:
+                self.auth.pop(repo, None)
+                self.authenticate(repo, response.headers.get("www-authenticate", ""))
+        return response
+
+    def tag_exists(self, repo: str, tag: str) -> bool:
+        """Return True if the manifest for ``repo:tag`` exists.
+
+        Only a 404 counts as absent. Tags are immutable, so treating an
+        auth or server error as absent would re-push over one; those raise
+        instead, after retries for the transient ones.
+        """
+        for attempt in range(LOOKUP_ATTEMPTS):
+            if attempt:
+                time.sleep(LOOKUP_BACKOFF * 2 ** (attempt - 1))
+            try:
+                response = self.request(
+                    "HEAD",
+                    repo,
+                    f"manifests/{tag}",
+                    headers={"Accept": MANIFEST_ACCEPT},
+                )
+            except httpx.TransportError:
+                if attempt == LOOKUP_ATTEMPTS - 1:
+                    raise
+                continue
+            if response.status_code not in TRANSIENT_STATUS:
+                break
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def push_blob(self, repo: str, data: bytes) -> dict:
+        """Upload a small blob unless it exists; returns its descriptor."""
+        digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+        if self.request("HEAD", repo, f"blobs/{digest}").status_code != 200:
+            upload = BlobUpload(self, repo)
+            upload.write(data)
+            upload.commit()
+        return {"digest": digest, "size": len(data)}
+
+    def push_manifest(self, repo: str, tag: str, manifest: dict) -> None:
+        response = self.request(
+            "PUT",
+            repo,
+            f"manifests/{tag}",
+            content=json.dumps(manifest, separators=(",", ":")).encode(),
+            headers={"Content-Type": manifest["mediaType"]},
+        )
+        response.raise_for_status()
+
+
+class BlobUpload(io.RawIOBase):
+    """Writable stream that uploads everything written to it as one blob.
+
+    Data is sent in ``UPLOAD_CHUNK_SIZE`` PATCH requests while it is hashed;
+    ``commit`` sends the remainder with the final PUT, which names the
+    digest. A blob smaller than one chunk thus goes up monolithically (POST
+    then a single PUT), and memory use never exceeds one chunk.
+    """
+
+    def __init__(self, registry: Registry, repo: str) -> None:
+        super().__init__()
+        self._registry = registry
+        self._repo = repo
+        response = registry.request("POST", repo, "blobs/uploads/")
+        response.raise_for_status()
+        self._location = urljoin(str(response.url), response.headers["location"])
+        self._buffer = bytearray()
+        self._offset = 0
+        self._sha256 = hashlib.sha256()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buffer += b
+        self._sha256.update(b)
+        if len(self._buffer) >= UPLOAD_CHUNK_SIZE:
+            self._send("PATCH")
+        return len(b)
+
+    def _send(self, method: str, **kwargs) -> None:
+        headers = {"Content-Type": "application/octet-stream"}
+        if method == "PATCH":
+            end = self._offset + len(self._buffer) - 1
+            headers["Content-Range"] = f"{self._offset}-{end}"
+        response = self._registry.request(
+            method,
+            self._repo,
+            self._location,
+            content=bytes(self._buffer),
+            headers=headers,
+            **kwargs,
+        )
+        response.raise_for_status()
+        if "location" in response.headers:
+            self._location = urljoin(str(response.url), response.headers["location"])
+        self._offset += len(self._buffer)
+        self._buffer.clear()
+
+    def commit(self) -> dict:
+        """Finish the upload; returns the blob's digest and size."""
+        digest = f"sha256:{self._sha256.hexdigest()}"
+        self._send("PUT", params={"digest": digest})
+        return {"digest": digest, "size": self._offset}
+
+
+def existing_refs(registry: Registry, refs: list[str]) -> set[str]:
+    """Return which of ``refs`` already have a manifest in the registry.
+
+    The lookups are HEAD requests sent concurrently over the registry's
+    shared connection pool; each repository authenticates once.
+    """
+
+    def exists(ref: str) -> bool:
+        _, repo, tag = split_ref(ref)
+        return registry.tag_exists(repo, tag)
+
+    with ThreadPoolExecutor(max_workers=LOOKUP_THREADS) as executor:
+        return {ref for ref, found in zip(refs, executor.map(exists, refs)) if found}
 
 
 def push_dataset(
@@ -205,39 +629,74 @@ def push_dataset(
     dirname: str,
     ref: str,
     source_url: str | None,
-) -> None:
-    """Pack ``dirname`` from ``parent`` and push it to ``ref`` (raises on failure)."""
-    with tempfile.TemporaryDirectory(prefix="g4data-") as tmp:
-        # The tarball basename becomes the OCI title annotation, so the consumer
-        # can predict the file it will receive: ``<dirname>.tar.gz``.
-        tar_name = f"{dirname}.tar.gz"
-        tar_path = Path(tmp) / tar_name
-        make_tarball(parent, dirname, tar_path)
-
-        cmd = [
-            "oras",
-            "push",
-            "--artifact-type",
-            ARTIFACT_TYPE,
-            "--annotation",
-            f"org.opencontainers.image.title={dirname}",
-        ]
-        if source_url:
-            cmd += ["--annotation", f"org.opencontainers.image.source={source_url}"]
-        cmd += [ref, f"{tar_name}:{LAYER_MEDIA_TYPE}"]
-        # Run in the temp dir so oras records the bare filename as the layer title.
-        subprocess.run(cmd, check=True, cwd=tmp)
+    compression: str,
+    pool: ThreadPoolExecutor,
+    registry: Registry,
+    split_size: int = 0,
+) -> int:
+    """Pack ``dirname`` from ``parent`` and push it to ``ref`` (raises on failure).
+
+    The tarball is streamed from the compressor straight into the layer
+    upload, so nothing is written to disk; the manifest is the one ``oras
+    push`` would make, minus its creation timestamp. With ``split_size``
+    (bytes), the dataset is split by ``split_entries`` into one layer per
+    part. Returns the number of layers.
+    """
+    media_type, suffix = COMPRESSIONS[compression]
+    _, repo, tag = split_ref(ref)
+
+    annotations = {"org.opencontainers.image.title": dirname}
+    if split_size:
+        parts = split_entries(parent / dirname, split_size)
+        annotations[SPLIT_ROOT_ANNOTATION] = dirname
+    else:
+        parts = [tree_entries(parent / dirname, dirname)]
+    if source_url:
+        annotations["org.opencontainers.image.source"] = source_url
+
+    layers = []
+    for index, entries in enumerate(parts):
+        upload = BlobUpload(registry, repo)
+        make_tarball(entries, upload, compression, pool)
+        # The consumer can predict the file it receives from the title,
+        # ``<dirname>.tar.gz`` (``<dirname>.part000.tar.gz`` ... when split)
+        title = f"{dirname}.part{index:03d}" if split_size else dirname
+        layers.append(
+            {
+                "mediaType": media_type,
+                **upload.commit(),
+                "annotations": {"org.opencontainers.image.title": f"{title}{suffix}"},
+            }
+        )
+    config = registry.push_blob(repo, EMPTY_CONFIG)
+
+    manifest = {
+        "schemaVersion": 2,
+        "mediaType": OCI_MANIFEST,
+        "artifactType": ARTIFACT_TYPE,
+        "config": {"mediaType": EMPTY_CONFIG_MEDIA_TYPE, **config},
+        "layers": layers,
+        "annotations": annotations,
+    }
+    registry.push_manifest(repo, tag, manifest)
+    return len(layers)
 
 
 @app.command()
 def main(
     config: Annotated[
-        Path | None,
-        typer.Option(help="Path to a geant4-config script (overrides --geant4-version)"),
+        list[Path] | None,
+        typer.Option(
+            help="Path to a geant4-config script; repeat for several "
+            "(overrides --geant4-version)"
+        ),
     ] = None,
     geant4_version: Annotated[
-        str | None,
-        typer.Option(help="Geant4 version whose geant4-config to locate on CVMFS"),
+        list[str] | None,
+        typer.Option(
+            help="Geant4 version whose geant4-config to locate on CVMFS; repeat, "
+            "or give a range such as 11.2.0..11.3.2"
+        ),
     ] = None,
     cvmfs_root: Annotated[
         Path,
@@ -265,98 +724,180 @@ def main(
         bool,
         typer.Option("--dry-run", help="Show what would be pushed without pushing"),
     ] = False,
+    compression: Annotated[
+        str,
+        typer.Option(
+            help="Layer compression: gzip (what download_geant4_datasets.py "
+            "reads) or zstd",
+        ),
+    ] = "gzip",
+    split_size: Annotated[
+        int,
+        typer.Option(
+            "--split-size",
+            help="Split each dataset into layers of about this many MB, pulled "
+            "in parallel by download_geant4_datasets.py (0: one layer)",
+            min=0,
+        ),
+    ] = 0,
 ) -> None:
-    """Ensure the Geant4 data sets requested by a geant4-config are in GHCR."""
-    if shutil.which("oras") is None:
-        console.print("[red]Error: oras not found in PATH[/red]")
+    """Ensure the Geant4 data sets requested by geant4-configs are in GHCR."""
+    if compression not in COMPRESSIONS:
+        console.print(
+            f"[red]Error: unknown compression {compression!r}, "
+            f"choose from {', '.join(COMPRESSIONS)}[/red]"
+        )
         raise typer.Exit(1)
 
-    if config is not None:
-        config_path = config
-        if not config_path.exists():
-            console.print(f"[red]Error: geant4-config not found: {config_path}[/red]")
-            raise typer.Exit(1)
-    elif geant4_version is not None:
-        config_path = find_geant4_config(cvmfs_root, geant4_version)
+    releases: dict[str, Path] = {}  # release label -> geant4-config
+    if config:
+        for config_path in config:
+            if not config_path.exists():
+                console.print(
+                    f"[red]Error: geant4-config not found: {config_path}[/red]"
+                )
+                raise typer.Exit(1)
+            releases[str(config_path)] = config_path
+    elif geant4_version:
+        for version in expand_versions(cvmfs_root, geant4_version):
+            releases[version] = find_geant4_config(cvmfs_root, version)
     else:
         console.print("[red]Error: pass --config or --geant4-version[/red]")
         raise typer.Exit(1)
-    console.print(f"[cyan]Using geant4-config: {config_path}[/cyan]")
+    for release, config_path in releases.items():
+        if release == str(config_path):
+            console.print(f"[cyan]Using geant4-config: {config_path}[/cyan]")
+        else:
+            console.print(
+                f"[cyan]Using geant4-config for {release}: {config_path}[/cyan]"
+            )
 
     if not data_dir.is_dir():
         console.print(f"[red]Error: data dir not found: {data_dir}[/red]")
         raise typer.Exit(1)
 
-    dataset_dirs = parse_dataset_dirs(config_path)
-    console.print(f"[cyan]geant4-config requests {len(dataset_dirs)} dataset(s)[/cyan]")
+    # dirname -> releases requesting it; each dirname is looked up and packed
+    # once however many releases share it
+    served_by: dict[str, list[str]] = {}
+    for release, config_path in releases.items():
+        for dirname in parse_dataset_dirs(config_path):
+            served_by.setdefault(dirname, []).append(release)
+    dataset_dirs = list(served_by)
+    console.print(
+        f"[cyan]{len(releases)} geant4-config(s) request {len(dataset_dirs)} "
+        f"distinct dataset(s)[/cyan]"
+    )
+
+    def serves(dirname: str) -> str:
+        return f"[dim]({', '.join(served_by[dirname])})[/dim]"
 
-    to_push: list[tuple[str, str]] = []  # (dirname, ref)
-    missing_source: list[str] = []
+    refs: dict[str, str] = {}  # dirname -> ref
     for dirname in dataset_dirs:
         parsed = split_name_version(dirname)
-        if parsed is None:
-            console.print(f"[red]✗ cannot parse name/version from {dirname}[/red]")
-            missing_source.append(dirname)
-            continue
-        name, version = parsed
-        ref = dataset_ref(repo_prefix, name, version)
-
-        if not force and tag_exists(ref):
-            console.print(f"[green]✓ present[/green] {ref}")
-            continue
+        if parsed is not None:
+            refs[dirname] = dataset_ref(repo_prefix, *parsed)
+
+    with httpx.Client(timeout=300.0) as client:
+        registry = Registry(client, repo_prefix.partition("/")[0])
+        try:
+            present = set() if force else existing_refs(registry, list(refs.values()))
+        except httpx.HTTPError as exc:
+            console.print(f"[red]Could not look up existing tags: {exc}[/red]")
+            raise typer.Exit(1)
 
-        if not (data_dir / dirname).is_dir():
+        to_push: list[tuple[str, str]] = []  # (dirname, ref)
+        missing_source: list[str] = []
+        for dirname in dataset_dirs:
+            ref = refs.get(dirname)
+            if ref is None:
+                console.print(
+                    f"[red]✗ cannot parse name/version from {dirname}[/red]"
+                )
+                missing_source.append(dirname)
+                continue
+
+            if ref in present:
+                console.print(f"[green]✓ present[/green] {ref} {serves(dirname)}")
+                continue
+
+            if not (data_dir / dirname).is_dir():
+                console.print(
+                    f"[red]✗ missing source[/red] {dirname} (not in {data_dir})"
+                )
+                missing_source.append(dirname)
+                continue
+
+            to_push.append((dirname, ref))
+
+        if to_push and not dry_run and registry.credentials is None:
+            # Anonymous tokens only allow pulls; say so now rather than let
+            # the first upload fail with a bare 401/403
             console.print(
-                f"[red]✗ missing source[/red] {dirname} (not in {data_dir})"
+                f"[red]No credentials for {repo_prefix.partition('/')[0]}: log in "
+                f"with `oras login` or `docker login` first[/red]"
             )
-            missing_source.append(dirname)
-            continue
+            raise typer.Exit(1)
+        if to_push and not dry_run:
+            console.print(f"[cyan]Pushing {len(to_push)} dataset(s)...[/cyan]")
+        elif dry_run:
+            console.print(
+                f"[yellow]DRY RUN: would push {len(to_push)} dataset(s):[/yellow]"
+            )
+            for dirname, ref in to_push:
+                console.print(
+                    f"  [cyan]•[/cyan] {dirname} -> {ref} {serves(dirname)}"
+                )
+
+        failed: list[str] = []
+        if to_push and not dry_run:
+            with (
+                ThreadPoolExecutor(max_workers=COMPRESS_THREADS) as pool,
+                ThreadPoolExecutor(max_workers=jobs) as executor,
+            ):
+                future_to_dataset = {
+                    executor.submit(
+                        push_dataset,
+                        data_dir,
+                        dirname,
+                        ref,
+                        source_url,
+                        compression,
+                        pool,
+                        registry,
+                        split_size << 20,
+                    ): (dirname, ref)
+                    for dirname, ref in to_push
+                }
+                for future in as_completed(future_to_dataset):
+                    dirname, ref = future_to_dataset[future]
+                    try:
+                        layers = future.result()
+                        parts = f" in {layers} layers" if split_size else ""
+                        console.print(
+                            f"[green]✓ pushed[/green] {ref}{parts} {serves(dirname)}"
+                        )
+                    except Exception as exc:  # noqa: BLE001
+                        console.print(f"[red]✗ failed[/red] {ref}: {exc}")
+                        failed.append(ref)
+
+        console.print()
+        if missing_source:
+            console.print(
+                f"[red]{len(missing_source)} requested dataset(s) not found in "
+                f"{data_dir}:[/red] {missing_source}"
+            )
+        if failed:
+            console.print(f"[red]{len(failed)} push(es) failed[/red]")
+        if missing_source or failed:
+            raise typer.Exit(1)
 
-        to_push.append((dirname, ref))
-
-    if to_push and not dry_run:
-        console.print(f"[cyan]Pushing {len(to_push)} dataset(s)...[/cyan]")
-    elif dry_run:
-        console.print(f"[yellow]DRY RUN: would push {len(to_push)} dataset(s):[/yellow]")
-        for dirname, ref in to_push:
-            console.print(f"  [cyan]•[/cyan] {dirname} -> {ref}")
-
-    failed: list[str] = []
-    if to_push and not dry_run:
-        with ThreadPoolExecutor(max_workers=jobs) as executor:
-            future_to_ref = {
-                executor.submit(push_dataset, data_dir, dirname, ref, source_url): ref
-                for dirname, ref in to_push
-            }
-            for future in as_completed(future_to_ref):
-                ref = future_to_ref[future]
-                try:
-                    future.result()
-                    console.print(f"[green]✓ pushed[/green] {ref}")
-                except subprocess.CalledProcessError as exc:
-                    console.print(f"[red]✗ failed[/red] {ref}: exit {exc.returncode}")
-                    failed.append(ref)
-                except Exception as exc:  # noqa: BLE001
-                    console.print(f"[red]✗ failed[/red] {ref}: {exc}")
-                    failed.append(ref)
-
-    console.print()
-    if missing_source:
+        if dry_run:
+            return
         console.print(
-            f"[red]{len(missing_source)} requested dataset(s) not found in "
-            f"{data_dir}:[/red] {missing_source}"
+            f"[green]✓ All {len(dataset_dirs)} dataset(s) requested by "
+            f"{len(releases)} release(s) available ({len(to_push)} newly pushed)"
+            f"[/green]"
         )
-    if failed:
-        console.print(f"[red]{len(failed)} push(es) failed[/red]")
-    if missing_source or failed:
-        raise typer.Exit(1)
-
-    if dry_run:
-        return
-    console.print(
-        f"[green]✓ All {len(dataset_dirs)} requested dataset(s) available "
-        f"({len(to_push)} newly pushed)[/green]"
-    )
 
 
 if __name__ == "__main__":
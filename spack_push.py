@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Push the specs of the spack environment in the working directory to a mirror.
+
+Specs are pushed in batches, each spec on its own (``--only package``), so a
+registry error costs at most a batch instead of the whole push. The specs of
+a failed batch are retried one by one, with exponential backoff and jitter,
+as long as their errors look transient; anything else (bad credentials, a
+broken spec) is reported at once. Pushed specs are recorded in a state file,
+so a rerun only pushes what is still missing.
+
+Only the standard library is used, and nothing newer than Python 3.9: this
+runs inside the build images, with their system python3.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Registry hiccups worth another attempt, as they show up in spack's output
+TRANSIENT_RE = re.compile(
+    r"\b(?:429|500|502|503|504)\b|too many requests|timed out|timeout"
+    r"|connection (?:reset|refused|aborted)|remote end closed|broken pipe"
+    r"|incompleteread|temporary failure in name resolution",
+    re.IGNORECASE,
+)
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+HASH_RE = re.compile(r"[a-z0-9]{32}")
+# The n-th retry waits between half and all of BACKOFF * 2**n, capped
+BACKOFF = 4.0
+BACKOFF_CAP = 300.0
+
+
+def spack_exe() -> str:
+    # setup-env.sh makes `spack` a shell function, which subprocesses do not see
+    root = os.environ.get("SPACK_ROOT")
+    return str(Path(root) / "bin" / "spack") if root else "spack"
+
+
+def env_specs() -> list[tuple[str, str]]:
+    """The environment's installed specs as (hash, name@version)."""
+    res = subprocess.run(
+        [spack_exe(), "-e", ".", "find", "--format", "{hash} {name}@{version}"],
+        capture_output=True,
+        encoding="utf-8",
+        check=True,
+    )
+    specs = []
+    for line in ANSI_RE.sub("", res.stdout).splitlines():
+        spec_hash, _, label = line.strip().partition(" ")
+        if HASH_RE.fullmatch(spec_hash):
+            specs.append((spec_hash, label))
+    return specs
+
+
+def push(hashes: list[str], mirror: str, base_image: str | None) -> tuple[bool, str]:
+    """Push ``hashes``, echoing spack's output; returns success and the output."""
+    cmd = [spack_exe(), "-e", ".", "buildcache", "push", "--only", "package"]
+    cmd += ["--allow-missing", "--unsigned"]
+    if base_image:
+        cmd += ["--base-image", base_image]
+    cmd += [mirror] + [f"/{h}" for h in hashes]
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding="utf-8"
+    )
+    output = []
+    for line in proc.stdout:
+        sys.stdout.write(line)
+        output.append(line)
+    return proc.wait() == 0, ANSI_RE.sub("", "".join(output))
+
+
+def backoff(retry: int) -> float:
+    delay = min(BACKOFF_CAP, BACKOFF * 2**retry)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def push_one(
+    spec: tuple[str, str], mirror: str, base_image: str | None, attempts: int
+) -> str | None:
+    """Push one spec with retries; returns why it failed, or None."""
+    spec_hash, label = spec
+    for attempt in range(1, attempts + 1):
+        ok, output = push([spec_hash], mirror, base_image)
+        if ok:
+            return None
+        if not TRANSIENT_RE.search(output):
+            return "failed (not retried, error does not look transient)"
+        if attempt < attempts:
+            delay = backoff(attempt - 1)
+            print(
+                f"+ {label}: transient failure on attempt {attempt}/{attempts}, "
+                f"retrying in {delay:.0f}s"
+            )
+            time.sleep(delay)
+    return f"failed {attempts} times with transient errors"
+
+
+def load_state(path: Path, key: str) -> set[str]:
+    try:
+        return set(json.loads(path.read_text()).get(key, []))
+    except (OSError, ValueError, AttributeError):
+        return set()
+
+
+def save_state(path: Path, key: str, pushed: set[str]):
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        state = {}
+    state[key] = sorted(pushed)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(state, indent=1))
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mirror", help="Name of the spack mirror to push to")
+    parser.add_argument("--base-image", help="Passed to spack buildcache push")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20,
+        help="Specs per spack buildcache push call (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--attempts",
+        type=int,
+        default=5,
+        help="Attempts per spec after its batch failed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=Path("spack_push_state.json"),
+        help="Where pushed specs are recorded (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    # Progress only carries over to pushes of the same specs to the same place
+    key = f"{args.mirror} {args.base_image or ''}".strip()
+    pushed = load_state(args.state, key)
+    specs = env_specs()
+    pending = [spec for spec in specs if spec[0] not in pushed]
+    print(
+        f"+ {len(specs)} specs in the environment, {len(specs) - len(pending)} "
+        f"already pushed, {len(pending)} to push"
+    )
+
+    start = time.monotonic()
+    failed: dict[str, str] = {}
+    for i in range(0, len(pending), args.batch_size):
+        batch = pending[i : i + args.batch_size]
+        print(f"+ Pushing specs {i + 1}-{i + len(batch)} of {len(pending)}")
+        ok, _ = push([h for h, _ in batch], args.mirror, args.base_image)
+        if ok:
+            pushed.update(h for h, _ in batch)
+        else:
+            # The specs pushed before the failure are skipped as present by
+            # spack, so retrying them one by one is cheap
+            print("+ Batch failed, pushing its specs one by one")
+            for spec in batch:
+                error = push_one(spec, args.mirror, args.base_image, args.attempts)
+                if error is None:
+                    pushed.add(spec[0])
+                else:
+                    failed[spec[1]] = error
+                    print(f"+ {spec[1]}: {error}")
+        save_state(args.state, key, pushed)
+
+    elapsed = time.monotonic() - start
+    print(
+        f"+ Pushed {len(pending) - len(failed)} of {len(pending)} specs "
+        f"in {elapsed:.0f}s"
+    )
+    if failed:
+        print(f"+ {len(failed)} specs could not be pushed:")
+        for label, error in failed.items():
+            print(f"  - {label}: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,11 +21,11 @@ fi
 source "$SPACK_ROOT"/share/spack/setup-env.sh
 
 echo "+ Pushing to buildcache"
-"$SCRIPT_DIR/retry.sh" spack -e . \
-  buildcache push \
+# Pushes spec by spec with retries for transient registry errors, and
+# remembers what it pushed in spack_push_state.json, so a rerun in the same
+# directory only pushes what is missing.
+python3 "$SCRIPT_DIR/spack_push.py" \
   --base-image "${BASE_IMAGE}" \
-  --allow-missing \
-  --unsigned \
   acts-spack-buildcache
 
   # --update-index \
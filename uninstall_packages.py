@@ -1,39 +1,28 @@
 #!/usr/bin/env python3
+"""Free disk space on a CI runner by removing large software it does not need.
 
-import subprocess
+Candidates are apt packages matching ``REMOVE_PATTERNS`` and paths matching
+``EXTRA_FILES``. Without ``--target-free`` all of them are removed. With it,
+they are sized up front and only the largest ones needed to reach that much
+free space are removed. A package with files under one of the paths is
+counted, and removed, with that path. Packages go in one apt-get call while
+the other paths are deleted concurrently; paths holding a package's files
+are only deleted once apt-get is done with them. Each item is reported with
+the time it took and how much free space grew since the previous report;
+as removals overlap, that includes what the ones still running freed
+meanwhile.
+"""
+
+import argparse
 import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
 from glob import glob
 
-packages = (
-    subprocess.run(
-        ["dpkg-query", "-Wf", "${Installed-Size}\t${Package}\n"],
-        capture_output=True,
-        check=True,
-    )
-    .stdout.decode()
-    .strip()
-    .split("\n")
-)
-
-
-def proc(line):
-    size, name = line.split("\t")
-    if len(size) > 0:
-        size = int(size)
-    else:
-        size = 0
-    return size, name.strip()
-
-
-packages = [proc(line) for line in packages]
-packages.sort(key=lambda pkg: pkg[0], reverse=True)
-num = 50
-print("Top", num, "heaviest packages:")
-for _, (size, pkg) in zip(range(num), packages):
-    print("-", pkg, f"{size/1e3}M")
-
-packages_to_remove = []
-remove_patterns = [
+REMOVE_PATTERNS = [
     "^dotnet-.*",
     "azure-cli",
     "^google-cloud-cli$",
@@ -45,32 +34,9 @@ remove_patterns = [
     "^mysql-server-core.*",
 ]
 
-for _, pkg in packages:
-    if any([re.search(p, pkg) for p in remove_patterns]):
-        packages_to_remove.append(pkg)
-
-print("Packages to remove:")
-for pkg in packages_to_remove:
-    print("-", pkg)
-
-if len(packages_to_remove) > 0:
-    subprocess.run(
-        [
-            "sudo",
-            "apt-get",
-            "remove",
-            "--purge",
-            "-y",
-        ]
-        + packages_to_remove,
-        check=True,
-    )
-
-subprocess.run(["sudo", "apt-get", "autoremove", "-y"], check=True)
-subprocess.run(["sudo", "apt-get", "clean"], check=True)
-
-extra_files = [
-    "/usr/share/dotnet/" "/home/packer",
+EXTRA_FILES = [
+    "/usr/share/dotnet/",
+    "/home/packer",
     "/home/linuxbrew",
     "/home/runner/.rustup",
     "/home/runner/.cargo",
@@ -93,8 +59,264 @@ extra_files = [
     "/usr/local/share/vcpkg",
 ]
 
-print("Extra files to remove:")
-for extra in extra_files:
-    for m in glob(extra):
-        print("Removing", m)
-        subprocess.run(["sudo", "rm", "-rf", m])
+# Sizing and deleting trees is bound by metadata I/O, not CPU; a few walks at
+# once keep the disk busy.
+WORKERS = 8
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+@dataclass
+class Item:
+    kind: str  # "package" or "path"
+    name: str
+    size: int | None = None  # bytes, only known with --target-free
+    # For a path: packages whose files are (partly) under it, removed with it
+    packages: list[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        text = f"{self.kind} {self.name}"
+        if self.packages:
+            text += f" (with package(s) {', '.join(self.packages)})"
+        if self.size is not None:
+            text += f", {format_size(self.size)}"
+        return text
+
+
+def parse_size(text: str) -> int:
+    """``40G`` -> bytes (binary units, as ``df -h`` prints them)."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?", text.strip(), re.I)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: int) -> str:
+    for unit in ("T", "G", "M", "K"):
+        if abs(size) >= SIZE_UNITS[unit]:
+            return f"{size / SIZE_UNITS[unit]:.1f}{unit}"
+    return f"{size}B"
+
+
+def installed_packages() -> list[tuple[int, str]]:
+    """Installed packages as (size in bytes, name), largest first."""
+    lines = (
+        subprocess.run(
+            ["dpkg-query", "-Wf", "${Installed-Size}\t${Package}\n"],
+            capture_output=True,
+            check=True,
+        )
+        .stdout.decode()
+        .strip()
+        .split("\n")
+    )
+    packages = []
+    for line in lines:
+        size, name = line.split("\t")
+        # dpkg reports KiB
+        packages.append((int(size) * 1024 if size else 0, name.strip()))
+    packages.sort(reverse=True)
+    return packages
+
+
+def path_size(path: str) -> int:
+    """Disk usage of ``path`` in bytes (0 if it cannot be measured)."""
+    res = subprocess.run(
+        ["sudo", "du", "-sb", path], capture_output=True, encoding="utf-8"
+    )
+    try:
+        return int(res.stdout.split()[0])
+    except (IndexError, ValueError):
+        return 0
+
+
+def package_files(name: str) -> list[str]:
+    res = subprocess.run(
+        ["dpkg-query", "-L", name], capture_output=True, encoding="utf-8"
+    )
+    return res.stdout.splitlines()
+
+
+def is_under(path: str, root: str) -> bool:
+    root = root.rstrip("/")
+    return path == root or path.startswith(root + "/")
+
+
+def candidates(
+    packages: list[tuple[int, str]], executor: ThreadPoolExecutor, sized: bool
+) -> list[Item]:
+    """Everything that can be removed; with ``sized``, how much each frees.
+
+    Sizing walks every path, which is as slow as deleting it, so it is only
+    done when the sizes are needed. A package installed under one of the
+    paths (such as dotnet under /usr/share/dotnet) is folded into that
+    path's item, so its space is not counted twice and the path is not
+    deleted while dpkg is removing the same files.
+    """
+    package_items = [
+        Item("package", name, size if sized else None)
+        for size, name in packages
+        if any(re.search(p, name) for p in REMOVE_PATTERNS)
+    ]
+    paths = sorted({m for pattern in EXTRA_FILES for m in glob(pattern)})
+    sizes = executor.map(path_size, paths) if sized else [None] * len(paths)
+    path_items = [Item("path", path, size) for path, size in zip(paths, sizes)]
+    items = []
+    files = executor.map(package_files, [item.name for item in package_items])
+    for item, item_files in zip(package_items, files):
+        owner = next(
+            (
+                path_item
+                for path_item in path_items
+                if any(is_under(f, path_item.name) for f in item_files)
+            ),
+            None,
+        )
+        if owner is None:
+            items.append(item)
+        else:
+            # du of the path already counts the package's files under it
+            owner.packages.append(item.name)
+    return items + path_items
+
+
+def plan(items: list[Item], needed: int | None) -> list[Item]:
+    """The fewest items that free ``needed`` bytes (all of them for None)."""
+    if needed is None:
+        return items
+    chosen = []
+    for item in sorted(items, key=lambda item: item.size, reverse=True):
+        if needed <= 0:
+            break
+        chosen.append(item)
+        needed -= item.size
+    return chosen
+
+
+def remove_packages(names: list[str]) -> float:
+    start = time.monotonic()
+    if names:
+        subprocess.run(
+            ["sudo", "apt-get", "remove", "--purge", "-y"] + names,
+            check=True,
+        )
+    subprocess.run(["sudo", "apt-get", "autoremove", "-y"], check=True)
+    subprocess.run(["sudo", "apt-get", "clean"], check=True)
+    return time.monotonic() - start
+
+
+def remove_path(path: str, after: Future | None = None) -> float:
+    if after is not None:
+        wait([after])
+    start = time.monotonic()
+    subprocess.run(["sudo", "rm", "-rf", path], check=True)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--target-free",
+        type=parse_size,
+        help="Stop once this much space is free on --mount, e.g. 40G "
+        "(default: remove everything)",
+    )
+    parser.add_argument(
+        "--mount", default="/", help="Filesystem --target-free refers to"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only show what would be removed"
+    )
+    args = parser.parse_args()
+
+    packages = installed_packages()
+    num = 50
+    print("Top", num, "heaviest packages:")
+    for size, pkg in packages[:num]:
+        print("-", pkg, format_size(size))
+
+    free_before = shutil.disk_usage(args.mount).free
+    print(f"Free on {args.mount}: {format_size(free_before)}")
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        items = candidates(packages, executor, sized=args.target_free is not None)
+        needed = None
+        if args.target_free is not None:
+            needed = args.target_free - free_before
+            if needed <= 0:
+                print(f"Already {format_size(args.target_free)} free, nothing to do")
+                return
+            available = sum(item.size for item in items)
+            if available < needed:
+                print(
+                    f"Warning: only {format_size(available)} can be removed, "
+                    f"{format_size(needed)} would be needed"
+                )
+        chosen = plan(items, needed)
+
+        print("Will remove:")
+        for item in chosen:
+            print(f"- {item.describe()}")
+        if needed is not None:
+            print(f"Estimated: {format_size(sum(item.size for item in chosen))}")
+        if args.dry_run or (not chosen and needed is not None):
+            return
+
+        start = time.monotonic()
+        # apt-get holds the dpkg lock, so the packages go in one call; it runs
+        # alongside the deletion of paths no package owns. rm does not take
+        # that lock, so a path holding package files waits for apt-get.
+        futures = {}
+        apt = None
+        to_purge = [item for item in chosen if item.kind == "package"]
+        names = [item.name for item in to_purge]
+        names += [name for item in chosen for name in item.packages]
+        # Removing everything also cleans up after earlier package removals
+        if names or needed is None:
+            apt = executor.submit(remove_packages, names)
+            futures[apt] = to_purge
+        path_futures = {
+            executor.submit(
+                remove_path, item.name, apt if item.packages else None
+            ): [item]
+            for item in chosen
+            if item.kind == "path"
+        }
+        futures.update(path_futures)
+
+        failed = False
+        last_free = free_before
+        for future in as_completed(futures):
+            group = futures[future]
+            free = shutil.disk_usage(args.mount).free
+            grown = f"+{format_size(free - last_free)} free"
+            last_free = free
+            try:
+                elapsed = future.result()
+            except subprocess.CalledProcessError as e:
+                # A path that cannot be deleted only costs its space; apt
+                # failing leaves the system in a state worth stopping for
+                failed = failed or future not in path_futures
+                print(f"Failed: {e} ({grown})")
+                continue
+            if not group:
+                print(f"Cleaned up packages in {elapsed:.1f}s, {grown}")
+            elif len(group) > 1:
+                print(f"Removed {len(group)} packages in {elapsed:.1f}s, {grown}:")
+            for item in group:
+                if len(group) > 1:
+                    print(f"- {item.describe()}")
+                else:
+                    print(f"Removed {item.describe()} in {elapsed:.1f}s, {grown}")
+
+    freed = shutil.disk_usage(args.mount).free - free_before
+    print(
+        f"Freed {format_size(freed)} in {time.monotonic() - start:.1f}s, "
+        f"{format_size(free_before + freed)} free on {args.mount}"
+    )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,13 @@
 # ]
 # ///
 
+import json
 import os
 import re
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import NamedTuple, Optional, List
 import plistlib
@@ -20,6 +22,16 @@ import typer
 from packaging import version
 
 
+DEFAULT_APPS_DIR = Path("/Applications")
+# Versions read from each Xcode's Info.plist, keyed by the plist's path and
+# valid while its mtime and inode are unchanged (replacing an app changes
+# both), so `list-versions` and `select` only parse plists of new apps.
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "xcode_manager.json"
+CACHE_FORMAT = 1
+# Info.plist reads are mostly waiting on the disk
+SCAN_WORKERS = 8
+
+
 class XcodeVersion(NamedTuple):
     version: str
     build: str
@@ -27,17 +39,55 @@ class XcodeVersion(NamedTuple):
     is_beta: bool
 
 
-def find_installed_xcode_apps() -> List[XcodeVersion]:
-    """Find all Xcode installations in /Applications."""
-    apps_dir = Path("/Applications")
+def read_info_plist(info_plist: Path) -> dict:
+    """Read the version fields of an Xcode's Info.plist."""
+    with open(info_plist, "rb") as f:
+        plist_data = plistlib.load(f)
+    return {
+        "version": plist_data.get("CFBundleShortVersionString", ""),
+        "build": plist_data.get("DTXcodeBuild", ""),
+    }
+
+
+def load_cache(cache_file: Path) -> dict:
+    """Load the discovery index; a missing or unreadable one is empty."""
+    try:
+        cache = json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("format") != CACHE_FORMAT:
+        return {}
+    return cache.get("entries", {})
+
+
+def save_cache(cache_file: Path, entries: dict) -> None:
+    """Replace the discovery index atomically; failing to is not an error."""
+    tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps({"format": CACHE_FORMAT, "entries": entries}))
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        typer.echo(f"Warning: Could not write {cache_file}: {e}", err=True)
+
+
+def find_installed_xcode_apps(
+    apps_dir: Path = DEFAULT_APPS_DIR, cache_file: Optional[Path] = None
+) -> List[XcodeVersion]:
+    """Find all Xcode installations in ``apps_dir``.
+
+    With ``cache_file``, plists unchanged since an earlier call are not read
+    again; the others are read in parallel.
+    """
     if not apps_dir.exists():
         return []
 
-    xcode_apps = []
+    candidates = []  # (app path, resolved path, Info.plist, stat key)
     seen_targets = set()  # Track resolved paths to avoid duplicates
     xcode_pattern = re.compile(r"^Xcode.*\.app$", re.IGNORECASE)
 
-    for app_path in apps_dir.iterdir():
+    for app_path in sorted(apps_dir.iterdir()):
         if not app_path.is_dir() or not xcode_pattern.match(app_path.name):
             continue
 
@@ -50,39 +100,73 @@ def find_installed_xcode_apps() -> List[XcodeVersion]:
         seen_targets.add(resolved_path)
 
         info_plist = resolved_path / "Contents" / "Info.plist"
-        if not info_plist.exists():
+        try:
+            st = info_plist.stat()
+        except OSError:
             continue
+        key = [st.st_mtime_ns, st.st_ino]
+        candidates.append((app_path, resolved_path, info_plist, key))
+
+    cached = load_cache(cache_file) if cache_file is not None else {}
+    entries = {}
+    misses = []
+    for _, _, info_plist, key in candidates:
+        entry = cached.get(str(info_plist))
+        if entry is not None and entry.get("key") == key:
+            entries[str(info_plist)] = entry
+        else:
+            misses.append((info_plist, key))
 
+    def scan(miss):
+        info_plist, key = miss
         try:
-            with open(info_plist, "rb") as f:
-                plist_data = plistlib.load(f)
+            return {"key": key, **read_info_plist(info_plist)}
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        scanned = list(executor.map(scan, misses))
+    failed = {}
+    for (info_plist, _), result in zip(misses, scanned):
+        if isinstance(result, Exception):
+            failed[str(info_plist)] = result
+        else:
+            entries[str(info_plist)] = result
 
-            bundle_version = plist_data.get("CFBundleShortVersionString", "")
-            build_version = plist_data.get("DTXcodeBuild", "")
+    # Rewritten only when something changed; entries of apps that are gone
+    # are dropped with it
+    if cache_file is not None and entries != cached:
+        save_cache(cache_file, entries)
 
-            if not bundle_version:
-                continue
+    xcode_apps = []
+    for app_path, resolved_path, info_plist, _ in candidates:
+        if str(info_plist) in failed:
+            e = failed[str(info_plist)]
+            typer.echo(f"Warning: Could not parse {app_path}: {e}", err=True)
+            continue
+        entry = entries[str(info_plist)]
+        bundle_version = entry["version"]
+        build_version = entry["build"]
 
-            # Check if it's a beta version (check both original and resolved paths)
-            is_beta = (
-                "beta" in bundle_version.lower()
-                or "beta" in app_path.name.lower()
-                or "beta" in resolved_path.name.lower()
-            )
+        if not bundle_version:
+            continue
 
-            # Use the resolved path as the canonical path
-            xcode_apps.append(
-                XcodeVersion(
-                    version=bundle_version,
-                    build=build_version,
-                    path=resolved_path,
-                    is_beta=is_beta,
-                )
-            )
+        # Check if it's a beta version (check both original and resolved paths)
+        is_beta = (
+            "beta" in bundle_version.lower()
+            or "beta" in app_path.name.lower()
+            or "beta" in resolved_path.name.lower()
+        )
 
-        except Exception as e:
-            typer.echo(f"Warning: Could not parse {app_path}: {e}", err=True)
-            continue
+        # Use the resolved path as the canonical path
+        xcode_apps.append(
+            XcodeVersion(
+                version=bundle_version,
+                build=build_version,
+                path=resolved_path,
+                is_beta=is_beta,
+            )
+        )
 
     # Sort by version (newest first)
     try:
@@ -159,10 +243,29 @@ def is_github_actions() -> bool:
 app = typer.Typer()
 
 
+@app.callback()
+def main(
+    ctx: typer.Context,
+    apps_dir: Path = typer.Option(
+        DEFAULT_APPS_DIR, "--apps-dir", help="Directory holding the Xcode*.app bundles"
+    ),
+    cache_file: Path = typer.Option(
+        DEFAULT_CACHE_FILE,
+        "--cache-file",
+        help="Index of already-read Info.plists, refreshed as apps change",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Read every Info.plist and leave the index alone"
+    ),
+):
+    """Discover, select and clean up Xcode installations."""
+    ctx.obj = {"apps_dir": apps_dir, "cache_file": None if no_cache else cache_file}
+
+
 @app.command()
-def list_versions():
+def list_versions(ctx: typer.Context):
     """List all installed Xcode versions."""
-    xcode_apps = find_installed_xcode_apps()
+    xcode_apps = find_installed_xcode_apps(**ctx.obj)
 
     if not xcode_apps:
         typer.echo("No Xcode installations found.")
@@ -178,6 +281,7 @@ def list_versions():
 
 @app.command()
 def select(
+    ctx: typer.Context,
     version_spec: str = typer.Argument(
         ..., help="Version to select (e.g., '15.0', 'latest', 'latest-stable')"
     ),
@@ -211,7 +315,7 @@ def select(
         typer.echo("This will DELETE other Xcode installations!", err=True)
         raise typer.Exit(1)
 
-    xcode_apps = find_installed_xcode_apps()
+    xcode_apps = find_installed_xcode_apps(**ctx.obj)
 
     if not xcode_apps:
         typer.echo("No Xcode installations found.", err=True)